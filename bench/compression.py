@@ -0,0 +1,89 @@
+"""
+Bytes on the wire with and without response compression.
+
+Seeds a scratch SQLite database with --rows vehicles and one user with
+--favourites favourite vehicles. Then it requests a page of /vehicles, the
+user's /users/favorites/<id>, and a streamed /vehicles export, once per
+Accept-Encoding. For each it reports the body size and the time the request
+took:
+
+    python bench/compression.py --rows 5000 --page 1000 --favourites 200
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+DB_PATH = os.path.join(tempfile.gettempdir(), "bench_compression.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+os.environ["COMPRESSION_ENABLED"] = "1"
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from app import app  # noqa: E402
+from compression import ENCODINGS  # noqa: E402
+from models import db, Users, Vehicles, Favourites_vehicles  # noqa: E402
+
+
+def seed(rows, favourites):
+    db.drop_all()
+    db.create_all()
+    db.session.execute(db.insert(Vehicles), [{
+        "name": f"Vehicle {i}", "model": f"Model {i % 97}", "vehicle_class": "wheeled",
+        "manufacturer": "Corellia Mining Corporation", "cost_in_credits": i * 10, "length": i % 50,
+        "crew": i % 12, "passengers": i % 30, "max_atmosphering_speed": 30 + i % 900,
+        "cargo_capacity": i * 3, "consumables": "2 months"} for i in range(rows)])
+    user = Users(user_name="bench", first_name="Bench", last_name="Mark", email="bench@example.com", password="secret")
+    db.session.add(user)
+    db.session.flush()
+    db.session.execute(db.insert(Favourites_vehicles), [
+        {"user_id": user.id, "vehicles_id": i + 1} for i in range(min(favourites, rows))])
+    db.session.commit()
+    return user.id
+
+
+def measure(client, url, encoding, repeat):
+    durations = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        response = client.get(url, headers={"Accept-Encoding": encoding})
+        size = len(response.get_data())
+        durations.append(time.perf_counter() - start)
+    return {"bytes": size, "encoding": response.headers.get("Content-Encoding", "identity"),
+            "ms": round(min(durations) * 1000, 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--page", type=int, default=1000)
+    parser.add_argument("--favourites", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    with app.app_context():
+        user_id = seed(args.rows, args.favourites)
+
+    client = app.test_client()
+    urls = {
+        "vehicles_page": f"/vehicles?limit={args.page}",
+        "favourites": f"/users/favorites/{user_id}",
+        "vehicles_stream": "/vehicles?stream=1",
+    }
+    report = {"rows": args.rows, "page": args.page, "favourites": args.favourites,
+              "min_size": app.config["COMPRESSION_MIN_SIZE"]}
+    for name, url in urls.items():
+        results = {encoding: measure(client, url, encoding, args.repeat) for encoding in ("identity",) + ENCODINGS}
+        for encoding in ENCODINGS:
+            results[encoding]["ratio"] = round(results["identity"]["bytes"] / results[encoding]["bytes"], 2)
+        report[name] = results
+
+    with app.app_context():
+        db.drop_all()
+    os.remove(DB_PATH)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+"""
+Load test of every route of the API, for comparing commits.
+
+Seeds the database at --url (a scratch SQLite file by default) with --scale
+people, vehicles and planets and --users users. Their favourites run from 0
+up to --max-favourites: most users have a few, some have thousands. Then
+each route gets --requests requests from --clients concurrent clients
+(threads driving the WSGI app in process). Reads go first, then creates,
+updates, deletes and favourites, so the writes never touch the rows the
+reads use. The report is JSON with per-route throughput, latency
+percentiles and SQL statements per request, plus the commit it ran on:
+
+    python bench/loadtest.py --scale 100000 --users 1000 --output before.json
+    python bench/loadtest.py --scale 100000 --users 1000 --output after.json --compare before.json
+
+With --compare the report also holds, per route, the ratio of each number
+to the baseline, and the run fails (exit 1) when a p95 latency grew by more
+than --tolerance or a route runs more SQL statements than before. Latencies
+are noisy on small runs, use a few thousand --requests for a p95 to compare.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import count
+from threading import local
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+DB_PATH = os.path.join(tempfile.gettempdir(), "bench_loadtest.db")
+
+sys.path.insert(0, SRC)
+from commands import generate_catalog, fake_person, fake_vehicle, fake_planet, GENDERS, CLIMATES
+
+
+def seed(db, scale, users, max_favourites, seed):
+    db.drop_all()
+    db.create_all()
+    # On an empty database the ids run from 1, the last user is the one with the most favourites
+    generate_catalog(db.engine, scale, scale, scale, users, max_favourites, seed)
+
+
+def scenarios(scale, users, rng):
+    """
+    (name, request factory) per route, in the order they run. A factory returns
+    (method, path, json body), or None when it has nothing left to delete.
+    """
+    created = {"people": [], "vehicles": [], "planets": []}
+    names = count()
+    builders = {"people": fake_person, "vehicles": fake_vehicle, "planets": fake_planet}
+    heavy_user = users  # the last user has the most favourites
+    added = {"people": [], "vehicle": [], "planet": []}
+
+    def create(kind):
+        return lambda: ("POST", f"/{kind}", builders[kind](rng, f"Load {kind} {next(names)}"))
+
+    def update(kind):
+        return lambda: ("PUT", f"/{kind}/{rng.randrange(1, scale + 1)}", {"height": rng.randrange(60, 260)} if kind == "people"
+                        else {"crew": rng.randrange(1, 50)} if kind == "vehicles" else {"diameter": rng.randrange(1000, 9999)})
+
+    def delete(kind):
+        # Only the rows made by POST /<kind>, see created_ids()
+        return lambda: ("DELETE", f"/{kind}/{created[kind].pop()}", None) if created[kind] else None
+
+    def favourite(label):
+        def factory():
+            pair = (rng.randrange(1, scale + 1), rng.randrange(1, users + 1))
+            added[label].append(pair)
+            return "POST", f"/favorite/{label}/{pair[0]}/{pair[1]}", None
+        return factory
+
+    def unfavourite(label):
+        # The favourites added by POST /favorite/<label>
+        def factory():
+            if not added[label]:
+                return None
+            target_id, user_id = added[label].pop()
+            return "DELETE", f"/favorite/{label}/{target_id}/{user_id}", None
+        return factory
+
+    return created, [
+        ("GET /", lambda: ("GET", "/", None)),
+        ("GET /users", lambda: ("GET", "/users?limit=100", None)),
+        ("GET /users/<id>", lambda: ("GET", f"/users/{rng.randrange(1, users + 1)}", None)),
+        ("GET /people", lambda: ("GET", "/people?limit=100", None)),
+        ("GET /people filtered", lambda: ("GET", f"/people?gender={rng.choice(GENDERS)}&sort=-mass&limit=100", None)),
+        ("GET /people/<id>", lambda: ("GET", f"/people/{rng.randrange(1, scale + 1)}", None)),
+        ("GET /vehicles", lambda: ("GET", "/vehicles?limit=100", None)),
+        ("GET /vehicles/<id>", lambda: ("GET", f"/vehicles/{rng.randrange(1, scale + 1)}", None)),
+        ("GET /planets", lambda: ("GET", "/planets?limit=100", None)),
+        ("GET /planets filtered", lambda: ("GET", f"/planets?climate={rng.choice(CLIMATES)}&population__gte=1000000&limit=100", None)),
+        ("GET /planets/<id>", lambda: ("GET", f"/planets/{rng.randrange(1, scale + 1)}", None)),
+        ("GET /search", lambda: ("GET", f"/search?q={rng.randrange(100, 999)}&limit=20", None)),
+        ("GET /users/favorites/<id>", lambda: ("GET", f"/users/favorites/{rng.randrange(1, users + 1)}", None)),
+        ("GET /users/favorites/<id> heavy", lambda: ("GET", f"/users/favorites/{heavy_user}", None)),
+        ("GET /users/favorites/<id> compact", lambda: ("GET", f"/users/favorites/{heavy_user}?format=compact", None)),
+        ("POST /people", create("people")),
+        ("POST /vehicles", create("vehicles")),
+        ("POST /planets", create("planets")),
+        ("POST /people/bulk", lambda: ("POST", "/people/bulk", [fake_person(rng, f"Bulk person {next(names)}") for i in range(100)])),
+        ("PUT /people/<id>", update("people")),
+        ("PUT /vehicles/<id>", update("vehicles")),
+        ("PUT /planets/<id>", update("planets")),
+        ("DELETE /people/<id>", delete("people")),
+        ("DELETE /vehicles/<id>", delete("vehicles")),
+        ("DELETE /planets/<id>", delete("planets")),
+        ("POST /favorite/people", favourite("people")),
+        ("POST /favorite/vehicle", favourite("vehicle")),
+        ("POST /favorite/planet", favourite("planet")),
+        ("POST /favorite/bulk", lambda: ("POST", f"/favorite/bulk/{rng.randrange(1, users + 1)}", {
+            "add": [{"kind": rng.choice(["people", "vehicle", "planet"]), "target_id": rng.randrange(1, scale + 1)}
+                    for i in range(20)]})),
+        ("DELETE /favorite/people", unfavourite("people")),
+        ("DELETE /favorite/vehicle", unfavourite("vehicle")),
+        ("DELETE /favorite/planet", unfavourite("planet")),
+    ]
+
+
+def created_ids(db, model, kind):
+    return [row.id for row in db.session.query(model.id).filter(model.name.like(f"Load {kind} %"))]
+
+
+def percentile(values, p):
+    return round(values[min(int(len(values) * p), len(values) - 1)] * 1000, 3)
+
+
+def run(app, requests, clients, queries):
+    """Send the (method, path, body) `requests` from `clients` threads, one test client each."""
+    chunks = [requests[i::clients] for i in range(clients)]
+
+    def client(chunk):
+        test_client = app.test_client()
+        results = []
+        for method, path, body in chunk:
+            queries.reset()
+            start = time.perf_counter()
+            response = test_client.open(path, method=method, json=body)
+            response.get_data()
+            results.append((time.perf_counter() - start, response.status_code, queries.count))
+        return results
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(clients) as pool:
+        results = [result for chunk in pool.map(client, chunks) for result in chunk]
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(result[0] for result in results)
+    statuses = {}
+    for result in results:
+        statuses[str(result[1])] = statuses.get(str(result[1]), 0) + 1
+    return {
+        "requests": len(results),
+        "errors": sum(1 for result in results if result[1] >= 500),
+        "status": statuses,
+        "requests_per_second": round(len(results) / elapsed, 1),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3),
+        "p50_ms": percentile(latencies, 0.50),
+        "p95_ms": percentile(latencies, 0.95),
+        "p99_ms": percentile(latencies, 0.99),
+        "queries_per_request": round(sum(result[2] for result in results) / len(results), 2),
+        "max_queries": max(result[2] for result in results),
+    }
+
+
+class QueryCounter(local):
+    """SQL statements run by the current thread since reset()."""
+    count = 0
+
+    def reset(self):
+        self.count = 0
+
+    def increment(self, *args):
+        self.count += 1
+
+
+def compare(report, baseline, tolerance):
+    regressions = []
+    for name, route in report["routes"].items():
+        before = baseline.get("routes", {}).get(name)
+        if before is None:
+            continue
+        route["compared"] = {
+            key: round(route[key] / before[key], 3) if before[key] else None
+            for key in ("requests_per_second", "p50_ms", "p95_ms", "p99_ms", "queries_per_request")}
+        if route["compared"]["p95_ms"] and route["compared"]["p95_ms"] > 1 + tolerance:
+            regressions.append(f"{name} (p95)")
+        # Query counts don't depend on the machine: any growth is a regression
+        if route["queries_per_request"] > before["queries_per_request"] + 0.05:
+            regressions.append(f"{name} (queries)")
+    report["baseline"] = baseline.get("meta", {})
+    report["regressions"] = regressions
+    return regressions
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=SRC, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=f"sqlite:///{DB_PATH}")
+    parser.add_argument("--scale", type=int, default=10000, help="people, vehicles and planets each")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--max-favourites", type=int, default=5000)
+    parser.add_argument("--requests", type=int, default=200, help="per route")
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--only", help="run the routes whose name contains this text")
+    parser.add_argument("--output", help="write the report here instead of stdout")
+    parser.add_argument("--compare", help="baseline report to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p95 growth against the baseline")
+    args = parser.parse_args()
+
+    os.environ["DATABASE_URL"] = args.url
+    import sqlalchemy
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+    from app import app
+    from models import db, People, Vehicles, Planets
+
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+    with app.app_context():
+        seed(db, args.scale, args.users, args.max_favourites, args.seed)
+    seed_seconds = time.perf_counter() - started
+
+    queries = QueryCounter()
+    event.listen(Engine, "before_cursor_execute", queries.increment)
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "url": sqlalchemy.engine.make_url(args.url).render_as_string(hide_password=True),
+            "scale": args.scale, "users": args.users, "max_favourites": args.max_favourites,
+            "requests": args.requests, "clients": args.clients, "seed": args.seed,
+            "seed_seconds": round(seed_seconds, 2),
+            "python": platform.python_version(), "sqlalchemy": sqlalchemy.__version__,
+            "json_provider": type(app.json).__name__, "cache_backend": app.config["CACHE_BACKEND"],
+        },
+        "routes": {},
+    }
+
+    models = {"people": People, "vehicles": Vehicles, "planets": Planets}
+    created, routes = scenarios(args.scale, args.users, rng)
+    for name, factory in routes:
+        if args.only and not args.only in name:
+            continue
+        requests = [request for request in (factory() for i in range(args.requests)) if request is not None]
+        if not requests:
+            continue
+        report["routes"][name] = run(app, requests, args.clients, queries)
+
+        method, path = name.split(" ")[:2]
+        kind = path.split("/")[1]
+        if method == "POST" and path == f"/{kind}" and kind in created:
+            with app.app_context():
+                created[kind] = created_ids(db, models[kind], kind)
+
+    regressions = []
+    if args.compare:
+        with open(args.compare) as baseline:
+            regressions = compare(report, json.load(baseline), args.tolerance)
+
+    if args.url == f"sqlite:///{DB_PATH}":
+        os.remove(DB_PATH)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output + "\n")
+    else:
+        print(output)
+    if regressions:
+        print(f"Regressions: {', '.join(regressions)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
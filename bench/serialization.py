@@ -0,0 +1,71 @@
+"""
+List endpoint serialization: ORM objects + serialize() + stdlib json (the old
+path) against column projections + the configured JSON provider.
+
+Seeds a scratch SQLite database with --rows vehicles and times building the
+JSON body of one page of --page rows with each path:
+
+    python bench/serialization.py --rows 20000 --page 1000
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import timeit
+
+DB_PATH = os.path.join(tempfile.gettempdir(), "bench_serialization.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from app import app  # noqa: E402
+from models import db, Vehicles  # noqa: E402
+from serialization import select_columns, to_dicts  # noqa: E402
+
+
+def seed(rows):
+    db.drop_all()
+    db.create_all()
+    db.session.execute(db.insert(Vehicles), [{
+        "name": f"Vehicle {i}", "model": f"Model {i % 97}", "vehicle_class": "wheeled",
+        "manufacturer": "Corellia Mining Corporation", "cost_in_credits": i * 10, "length": i % 50,
+        "crew": i % 12, "passengers": i % 30, "max_atmosphering_speed": 30 + i % 900,
+        "cargo_capacity": i * 3, "consumables": "2 months"} for i in range(rows)])
+    db.session.commit()
+
+
+def orm_path(page):
+    rows = Vehicles.query.order_by(Vehicles.id).limit(page).all()
+    body = json.dumps({"msg": "Ok", "response": [row.serialize() for row in rows]}, sort_keys=True)
+    db.session.expunge_all()
+    return body
+
+
+def projection_path(page):
+    rows = select_columns(Vehicles).order_by(Vehicles.id).limit(page).all()
+    return app.json.dumps({"msg": "Ok", "response": to_dicts(rows)})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--page", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with app.app_context():
+        seed(args.rows)
+        report = {"rows": args.rows, "page": args.page, "json_provider": type(app.json).__name__}
+        for name, path in (("orm_serialize_stdlib_json", orm_path), ("projection_fast_json", projection_path)):
+            path(args.page)
+            seconds = min(timeit.repeat(lambda: path(args.page), number=1, repeat=args.repeat))
+            report[name + "_ms"] = round(seconds * 1000, 3)
+        report["speedup"] = round(report["orm_serialize_stdlib_json_ms"] / report["projection_fast_json_ms"], 2)
+        db.drop_all()
+
+    os.remove(DB_PATH)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
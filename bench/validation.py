@@ -0,0 +1,52 @@
+"""
+Cost of validating one request body with the compiled model schemas.
+
+Times Schema.validate on a valid and an invalid body for each catalog model,
+next to the cost of building the schema from the columns, which is what every
+request would pay if the rules were not compiled once at startup:
+
+    python bench/validation.py --iterations 100000
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from models import People, Vehicles, Planets  # noqa: E402
+from validation import Schema, SCHEMAS  # noqa: E402
+
+BODIES = {
+    People: {"name": "Luke Skywalker", "gender": "male", "birth_year": "19BBY", "eye_color": "blue",
+             "hair_color": "blond", "mass": 77, "height": 172},
+    Vehicles: {"name": "Sand Crawler", "model": "Digger Crawler", "vehicle_class": "wheeled",
+               "manufacturer": "Corellia Mining", "cost_in_credits": 150000, "length": 36, "crew": 46,
+               "passengers": 30, "max_atmosphering_speed": 30, "cargo_capacity": 50000, "consumables": "2 months"},
+    Planets: {"name": "Tatooine", "climate": "arid", "diameter": 10465, "gravity": "1 standard",
+              "orbital_period": 304, "population": 200000, "rotation_period": 23, "surface_water": 1,
+              "terrain": "desert"},
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=100000)
+    args = parser.parse_args()
+
+    report = {}
+    for model, body in BODIES.items():
+        schema = SCHEMAS[model]
+        invalid = {key: str(value) if type(value) == int else 1 for key, value in body.items()}
+        report[model.__tablename__] = {
+            "validate_valid_us": round(timeit.timeit(lambda: schema.validate(body), number=args.iterations) / args.iterations * 1e6, 3),
+            "validate_invalid_us": round(timeit.timeit(lambda: schema.validate(invalid), number=args.iterations) / args.iterations * 1e6, 3),
+            "validate_partial_us": round(timeit.timeit(lambda: schema.validate({"name": "x"}, partial=True), number=args.iterations) / args.iterations * 1e6, 3),
+            "build_schema_us": round(timeit.timeit(lambda: Schema(model), number=args.iterations // 10) / (args.iterations // 10) * 1e6, 3),
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+"""unique favourites per user and target
+
+Revision ID: 5b2e9c7d41a3
+Revises: fd5ff319b0c2
+Create Date: 2026-10-17 10:12:40.318225
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b2e9c7d41a3'
+down_revision = 'fd5ff319b0c2'
+branch_labels = None
+depends_on = None
+
+
+FAVOURITES = [
+    ('favourites_people', 'person_id'),
+    ('favourites_vehicles', 'vehicles_id'),
+    ('favourites_planets', 'planets_id'),
+]
+
+
+def upgrade():
+    for table, column in FAVOURITES:
+        # Keep the oldest row of any duplicated pair, the index can't be built otherwise
+        op.execute(
+            f'DELETE FROM {table} WHERE id NOT IN '
+            f'(SELECT keep_id FROM (SELECT MIN(id) AS keep_id FROM {table} GROUP BY user_id, {column}) AS keep)')
+        op.create_index(f'ix_{table}_user_id_{column}', table, ['user_id', column], unique=True)
+
+
+def downgrade():
+    for table, column in FAVOURITES:
+        op.drop_index(f'ix_{table}_user_id_{column}', table_name=table)
@@ -0,0 +1,68 @@
+"""catalog name search indexes
+
+Revision ID: 9d3f6a1b7c20
+Revises: e4a7b2c9d815
+Create Date: 2026-10-17 15:48:03.527114
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d3f6a1b7c20'
+down_revision = 'e4a7b2c9d815'
+branch_labels = None
+depends_on = None
+
+
+# Searched columns, see src/search.py. The kind offset makes the FTS rowid
+# unique per row (id * 4 + offset), so the triggers update by rowid.
+SEARCHED = [
+    ('people', 'people', 1, ['name']),
+    ('vehicles', 'vehicle', 2, ['name', 'model', 'manufacturer']),
+    ('planets', 'planet', 3, ['name']),
+]
+
+FTS_COLUMNS = ['name', 'model', 'manufacturer']
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+
+    if dialect == 'postgresql':
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for table, kind, offset, columns in SEARCHED:
+            for column in columns:
+                op.execute(f'CREATE INDEX ix_{table}_{column}_trgm ON {table} USING gin (lower({column}) gin_trgm_ops)')
+
+    elif dialect == 'sqlite':
+        op.execute("CREATE VIRTUAL TABLE catalog_search USING fts5("
+                   "kind UNINDEXED, ref_id UNINDEXED, name, model, manufacturer, tokenize = 'trigram')")
+        for table, kind, offset, columns in SEARCHED:
+            names = ', '.join(columns)
+            new_values = ', '.join(f'new.{column}' for column in columns)
+            op.execute(f"INSERT INTO catalog_search (rowid, kind, ref_id, {names}) "
+                       f"SELECT id * 4 + {offset}, '{kind}', id, {names} FROM {table}")
+            op.execute(f"CREATE TRIGGER {table}_search_insert AFTER INSERT ON {table} BEGIN "
+                       f"INSERT INTO catalog_search (rowid, kind, ref_id, {names}) "
+                       f"VALUES (new.id * 4 + {offset}, '{kind}', new.id, {new_values}); END")
+            op.execute(f"CREATE TRIGGER {table}_search_update AFTER UPDATE OF {names} ON {table} BEGIN "
+                       f"UPDATE catalog_search SET ({names}) = ({new_values}) WHERE rowid = old.id * 4 + {offset}; END")
+            op.execute(f"CREATE TRIGGER {table}_search_delete AFTER DELETE ON {table} BEGIN "
+                       f"DELETE FROM catalog_search WHERE rowid = old.id * 4 + {offset}; END")
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+
+    if dialect == 'postgresql':
+        for table, kind, offset, columns in SEARCHED:
+            for column in columns:
+                op.execute(f'DROP INDEX ix_{table}_{column}_trgm')
+
+    elif dialect == 'sqlite':
+        for table, kind, offset, columns in SEARCHED:
+            for action in ('insert', 'update', 'delete'):
+                op.execute(f'DROP TRIGGER {table}_search_{action}')
+        op.execute('DROP TABLE catalog_search')
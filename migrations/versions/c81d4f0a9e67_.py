@@ -0,0 +1,35 @@
+"""index favourites target columns
+
+Revision ID: c81d4f0a9e67
+Revises: 5b2e9c7d41a3
+Create Date: 2026-10-17 11:02:15.604318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c81d4f0a9e67'
+down_revision = '5b2e9c7d41a3'
+branch_labels = None
+depends_on = None
+
+
+# The unique (user_id, <target>) indexes already serve lookups by user and by
+# pair; these cover lookups by target and the FK checks when a target is deleted.
+FAVOURITES = [
+    ('favourites_people', 'person_id'),
+    ('favourites_vehicles', 'vehicles_id'),
+    ('favourites_planets', 'planets_id'),
+]
+
+
+def upgrade():
+    for table, column in FAVOURITES:
+        op.create_index(f'ix_{table}_{column}', table, [column], unique=False)
+
+
+def downgrade():
+    for table, column in FAVOURITES:
+        op.drop_index(f'ix_{table}_{column}', table_name=table)
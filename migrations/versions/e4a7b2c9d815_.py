@@ -0,0 +1,37 @@
+"""index catalog filter and sort columns
+
+Revision ID: e4a7b2c9d815
+Revises: c81d4f0a9e67
+Create Date: 2026-10-17 14:26:51.190772
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4a7b2c9d815'
+down_revision = 'c81d4f0a9e67'
+branch_labels = None
+depends_on = None
+
+
+# (column, id) so an equality filter keeps the default id order, and a sort on
+# the column pages with (column, id) keyset cursors, straight from the index.
+INDEXES = {
+    'people': ['gender', 'eye_color', 'hair_color', 'mass', 'height'],
+    'vehicles': ['vehicle_class', 'manufacturer', 'cost_in_credits', 'crew', 'passengers', 'cargo_capacity'],
+    'planets': ['climate', 'terrain', 'population', 'diameter'],
+}
+
+
+def upgrade():
+    for table, columns in INDEXES.items():
+        for column in columns:
+            op.create_index(f'ix_{table}_{column}_id', table, [column, 'id'], unique=False)
+
+
+def downgrade():
+    for table, columns in INDEXES.items():
+        for column in columns:
+            op.drop_index(f'ix_{table}_{column}_id', table_name=table)
@@ -6,9 +6,24 @@ from flask import Flask, request, jsonify, url_for
 from flask_migrate import Migrate
 from flask_swagger import swagger
 from flask_cors import CORS
-from utils import APIException, generate_sitemap
+from sqlalchemy.orm import joinedload
+from utils import APIException, generate_sitemap, paginate, wants_stream, stream_rows
 from admin import setup_admin
-from models import db, Users, Favourites_people, People, Vehicles, Favourites_vehicles, Favourites_planets, Planets
+from bulk import bulk_create, bulk_favourites
+from favourites import wants_compact, compact_favourites
+from cache import setup_cache, get_serialized
+from etag import etagged
+from compression import setup_compression
+from metrics import setup_metrics
+from slowlog import setup_slow_query_log
+from pool import setup_pool
+from replicas import setup_replicas
+from commands import setup_commands
+from validation import SCHEMAS
+from filters import apply_filters, requested_sort
+from search import search, FTS_TABLE
+from serialization import setup_json, select_columns, to_dicts, requested_fields, get_projected
+from models import db, Users, Favourites_people, People, Vehicles, Favourites_vehicles, Favourites_planets, Planets, insert_ignore
 
 # from models import Person
 
@@ -22,11 +37,53 @@ if db_url is not None:
 else:
     app.config['SQLALCHEMY_DATABASE_URI'] = "sqlite:////tmp/test.db"
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-
-MIGRATE = Migrate(app, db)
+app.config['DATABASE_READ_URL'] = os.getenv("DATABASE_READ_URL", "")
+app.config['REPLICA_STRATEGY'] = os.getenv("REPLICA_STRATEGY", "round_robin")
+app.config['REPLICA_STICKY_SECONDS'] = int(os.getenv("REPLICA_STICKY_SECONDS", 5))
+app.config['DB_POOL_SIZE'] = int(os.getenv("DB_POOL_SIZE", 5))
+app.config['DB_MAX_OVERFLOW'] = int(os.getenv("DB_MAX_OVERFLOW", 10))
+app.config['DB_POOL_TIMEOUT'] = int(os.getenv("DB_POOL_TIMEOUT", 30))
+app.config['DB_POOL_RECYCLE'] = int(os.getenv("DB_POOL_RECYCLE", 1800))
+app.config['DB_POOL_PRE_PING'] = os.getenv("DB_POOL_PRE_PING", "1") == "1"
+app.config['DB_STATEMENT_TIMEOUT'] = int(os.getenv("DB_STATEMENT_TIMEOUT", 0))
+app.config['PAGE_SIZE'] = int(os.getenv("PAGE_SIZE", 100))
+app.config['MAX_PAGE_SIZE'] = int(os.getenv("MAX_PAGE_SIZE", 1000))
+app.config['STREAM_BATCH_SIZE'] = int(os.getenv("STREAM_BATCH_SIZE", 1000))
+app.config['BULK_MAX_ITEMS'] = int(os.getenv("BULK_MAX_ITEMS", 5000))
+app.config['CACHE_BACKEND'] = os.getenv("CACHE_BACKEND", "memory")
+app.config['CACHE_SQLITE_PATH'] = os.getenv("CACHE_SQLITE_PATH", "/tmp/sw_endpoints_cache.db")
+app.config['CACHE_REDIS_URL'] = os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0")
+app.config['CACHE_TTL'] = int(os.getenv("CACHE_TTL", 300))
+app.config['CACHE_MAX_ENTRIES'] = int(os.getenv("CACHE_MAX_ENTRIES", 10000))
+app.config['JSON_PROVIDER'] = os.getenv("JSON_PROVIDER", "orjson")
+app.config['COMPRESSION_ENABLED'] = os.getenv("COMPRESSION_ENABLED", "1") == "1"
+app.config['COMPRESSION_MIN_SIZE'] = int(os.getenv("COMPRESSION_MIN_SIZE", 1024))
+app.config['COMPRESSION_GZIP_LEVEL'] = int(os.getenv("COMPRESSION_GZIP_LEVEL", 6))
+app.config['COMPRESSION_BROTLI_QUALITY'] = int(os.getenv("COMPRESSION_BROTLI_QUALITY", 4))
+app.config['ASGI_WSGI_THREADS'] = int(os.getenv("ASGI_WSGI_THREADS", 10))
+app.config['METRICS_ENABLED'] = os.getenv("METRICS_ENABLED", "0") == "1"
+app.config['SLOW_QUERY_MS'] = float(os.getenv("SLOW_QUERY_MS", 0))
+app.config['SLOW_QUERY_EXPLAIN'] = os.getenv("SLOW_QUERY_EXPLAIN", "0") == "1"
+app.config['SLOW_QUERY_LOG'] = os.getenv("SLOW_QUERY_LOG", "/tmp/sw_slow_queries.log")
+app.config['SLOW_QUERY_LOG_MAX_BYTES'] = int(os.getenv("SLOW_QUERY_LOG_MAX_BYTES", 10 * 1024 * 1024))
+app.config['SLOW_QUERY_LOG_BACKUPS'] = int(os.getenv("SLOW_QUERY_LOG_BACKUPS", 5))
+
+# Keep autogenerate away from the search index tables built by migration 9d3f6a1b7c20
+def include_object(object, name, type_, reflected, compare_to):
+    return not (type_ == "table" and name.startswith(FTS_TABLE))
+
+MIGRATE = Migrate(app, db, include_object=include_object)
+setup_pool(app)
+setup_replicas(app)
 db.init_app(app)
 CORS(app)
 setup_admin(app)
+setup_cache(app)
+setup_json(app)
+setup_metrics(app)
+setup_slow_query_log(app)
+setup_compression(app)
+setup_commands(app)
 
 # Handle/serialize errors like a JSON object
 
@@ -43,79 +100,103 @@ def sitemap():
 # GET ALL ENDPOINTS
 # USERS
 @app.route('/users', methods=['GET'])
+@etagged("users")
 def users_get_all():
+    if wants_stream():
+        return stream_rows(select_columns(Users, requested_fields(Users)), Users)
+
     response_body = {}
-    users = list(map(lambda item: item.serialize(), Users.query.all()))
+    users, next_cursor = paginate(select_columns(Users, requested_fields(Users)), Users)
+    users = to_dicts(users)
 
     if not users:
         return jsonify(response_body), 204  # No content
     
     response_body["msg"] = "Ok"
     response_body["response"] = users
+    response_body["next"] = next_cursor
     return jsonify(response_body), 200
 
 @app.route('/users/<int:id>', methods=['GET'])
+@etagged("users")
 def users_get_one(id):
     response_body = {}
-    user = Users.query.get(id)
+    user = get_projected(Users, id, requested_fields(Users))
 
     if user == None:
         response_body["msg"]=f"Not found. User with id {id} doesn't exist"
         return jsonify(response_body), 404
 
     response_body["msg"]="Ok"
-    response_body["response"]= user.serialize()
+    response_body["response"]= user
     return jsonify(response_body), 200
 
 # PEOPLE
 @app.route('/people', methods=['GET'])
+@etagged("people")
 def people_get_all():
+    sort = requested_sort(People)
+    query = apply_filters(select_columns(People, requested_fields(People, sort)), People)
+    if wants_stream():
+        return stream_rows(query, People, sort)
+
     response_body = {}
-    people = list(map(lambda item: item.serialize(), People.query.all()))
+    people, next_cursor = paginate(query, People, sort)
+    people = to_dicts(people)
 
     if not people:
         return jsonify(response_body), 204  # No content
 
     response_body["msg"]="Ok"
     response_body["response"]=people
+    response_body["next"]=next_cursor
     return jsonify(response_body), 200
 
 @app.route('/people/<int:id>', methods=['GET'])
+@etagged("people")
 def people_get_one(id):
 
     response_body = {}
-    person = People.query.get(id)
+    person = get_serialized(People, id, requested_fields(People))
 
     if person == None:
         response_body["msg"] = f"Not found. Person with id {id} doesn't exist"
         return jsonify(response_body), 404
 
     response_body["msg"] = "Ok"
-    response_body["response"] = person.serialize()
+    response_body["response"] = person
     return jsonify(response_body), 200
 
 
 # VEHICLES
 
 @app.route('/vehicles', methods=['GET'])
+@etagged("vehicles")
 def vehicles_get_all():
-    response_body = {}
+    sort = requested_sort(Vehicles)
+    query = apply_filters(select_columns(Vehicles, requested_fields(Vehicles, sort)), Vehicles)
+    if wants_stream():
+        return stream_rows(query, Vehicles, sort)
 
-    vehicles = list(map(lambda item: item.serialize(), Vehicles.query.all()))
+    response_body = {}
+    vehicles, next_cursor = paginate(query, Vehicles, sort)
+    vehicles = to_dicts(vehicles)
 
     if not vehicles:
         return jsonify(response_body), 204  # No content
 
     response_body["msg"] = "Ok"
     response_body["response"] = vehicles
+    response_body["next"] = next_cursor
 
     return jsonify(response_body), 200
 
 
 @app.route('/vehicles/<int:id>', methods=['GET'])
+@etagged("vehicles")
 def vehicles_get_one(id):
     response_body = {}
-    vehicle = Vehicles.query.get(id)
+    vehicle = get_serialized(Vehicles, id, requested_fields(Vehicles))
 
     if vehicle == None:
         response_body["msg"] = f"Vehicle with id {id} doesn't exist"
@@ -123,40 +204,56 @@ def vehicles_get_one(id):
     
 
     response_body["msg"] = "Ok"
-    response_body["response"] = vehicle.serialize()
+    response_body["response"] = vehicle
     return jsonify(response_body), 200
 
 
 # PLANETS
 
 @app.route('/planets', methods=['GET'])
+@etagged("planets")
 def planets_get_all():
+    sort = requested_sort(Planets)
+    query = apply_filters(select_columns(Planets, requested_fields(Planets, sort)), Planets)
+    if wants_stream():
+        return stream_rows(query, Planets, sort)
+
     response_body = {}
-    planets = list(map(lambda item: item.serialize(), Planets.query.all()))
+    planets, next_cursor = paginate(query, Planets, sort)
+    planets = to_dicts(planets)
 
     if not planets:
         return jsonify(response_body), 204  # No content
 
     response_body["msg"] = "Ok"
     response_body["response"] = planets
+    response_body["next"] = next_cursor
 
     return jsonify(response_body), 200
 
 
 @app.route('/planets/<int:id>', methods=['GET'])
+@etagged("planets")
 def planets_get_one(id):
     response_body = {}
-    planet = Planets.query.get(id)
+    planet = get_serialized(Planets, id, requested_fields(Planets))
 
     if planet == None:
         response_body["msg"] = f"Planet with id {id} doesn't exist"
         return jsonify(response_body), 404
 
     response_body["msg"] = "Ok"
-    response_body["response"] = planet.serialize()
+    response_body["response"] = planet
     return jsonify(response_body), 200
 
 
+# SEARCH
+@app.route('/search', methods=['GET'])
+@etagged("people", "vehicles", "planets")
+def search_catalog():
+    return search()
+
+
 # POST PEOPLE
 @app.route('/people', methods=['POST'])
 def people_post():
@@ -164,80 +261,22 @@ def people_post():
 
     r = request.get_json(force=True)
 
-    # Check if empty
-    if r is None:
-        response_body["msg"] = "The request body is null"
-        return jsonify(response_body), 400
-
-    # Check if propierties exists
-    if not "name" in r:
-        response_body["msg"] = "Name not found"
-        return jsonify(response_body), 400
-
-    if not "mass" in r:
-        response_body["msg"] = "Mass not found"
-        return jsonify(response_body), 400
-
-    if not "height" in r:
-        response_body["msg"] = "Height not found"
-        return jsonify(response_body), 400
-
-    if not "hair_color" in r:
-        response_body["msg"] = "Hair color not found"
-        return jsonify(response_body), 400
-
-    if not "gender" in r:
-        response_body["msg"] = "Gender not found"
-        return jsonify(response_body), 400
-
-    if not "eye_color" in r:
-        response_body["msg"] = "Eye color not found"
-        return jsonify(response_body), 400
-
-    if not "birth_year" in r :
-        response_body["msg"] = "Birth year not found"
-        return jsonify(response_body), 400 
-    
-    # Check types
-    if type(r["name"]) != str:
-        response_body["msg"] = "Name must be a string"
-        return jsonify(response_body), 400
-
-    if type(r["birth_year"]) != str:
-        response_body["msg"] = "Birth year must be a string"
-        return jsonify(response_body), 400
-
-    if type(r["eye_color"]) != str:
-        response_body["msg"] = "Eye color must be a string"
-        return jsonify(response_body), 400
-    
-    if type(r["gender"]) != str:
-        response_body["msg"] = "Gender must be a string"
-        return jsonify(response_body), 400
-    
-    if type(r["hair_color"]) != str:
-        response_body["msg"] = "Hair color must be a string"
-        return jsonify(response_body), 400
-
-    if type(r["height"]) != int:
-        response_body["msg"] = "Height must be a integer"
-        return jsonify(response_body), 400
-    
-    if type(r["mass"]) != int:
-        response_body["msg"] = "Mass must be a integer"
+    # Check propierties and their types
+    errors = SCHEMAS[People].validate(r)
+    if errors:
+        response_body["msg"] = errors[0]
+        response_body["errors"] = errors
         return jsonify(response_body), 400
 
     # Check unique name
-    filter_name = People.query.filter_by(
-        name=r["name"]).first()  
-    
+    filter_name = People.query.filter_by(name=r["name"]).first()
+
     if filter_name != None:
         response_body["msg"] = "Name must be unique"
         return jsonify(response_body), 400
 
     # Insert in table
-    person = People(name=r["name"], gender=r["gender"], birth_year=r["birth_year"],
-                    eye_color=r["eye_color"], hair_color=r["hair_color"], mass=r["mass"], height=r["height"])
+    person = People(**SCHEMAS[People].values(r))
 
     db.session.add(person)
     db.session.commit()
@@ -248,120 +287,26 @@ def people_post():
 # POST VEHICLES
 @app.route('/vehicles', methods=['POST'])
 def vehicles_post():
-
     response_body = {}
 
     r = request.get_json(force=True)
 
-    # Check if empty
-    if r is None:
-        return "The request body is null", 400
-
-    # Check if propierties exists
-    if not "name" in r:
-        response_body["msg"] = "Name not found"
-        return jsonify(response_body), 400
-
-    if not "cargo_capacity" in r:
-        response_body["msg"] = "Cargo Capacity not found"
-        return jsonify(response_body), 400
-
-    if not "consumables" in r:
-        response_body["msg"] = "Consumables not found"
-        return jsonify(response_body), 400
-
-    if not "cost_in_credits" in r:
-        response_body["msg"] = "Cost in credits color not found"
-        return jsonify(response_body), 400
-
-    if not "crew" in r:
-        response_body["msg"] = "Crew not found"
-        return jsonify(response_body), 400
-
-    if not "length" in r:
-        response_body["msg"] = "Length color not found"
-        return jsonify(response_body), 400
-
-    if not "manufacturer" in r:
-        response_body["msg"] = "Manufacturer not found"
+    # Check propierties and their types
+    errors = SCHEMAS[Vehicles].validate(r)
+    if errors:
+        response_body["msg"] = errors[0]
+        response_body["errors"] = errors
         return jsonify(response_body), 400
 
-    if not "max_atmosphering_speed" in r:
-        response_body["msg"] = "Max atmosphering speed not found"
-        return jsonify(response_body), 400
-
-    if not "model" in r:
-        response_body["msg"] = "Model not found"
-        return jsonify(response_body), 400
-
-    if not "passengers" in r:
-        response_body["msg"] = "Passengers not found"
-        return jsonify(response_body), 400
-
-    if not "vehicle_class" in r:
-        response_body["msg"] = "Vehicle class not found"
-        return jsonify(response_body), 400
-
-    # Check types
-    if type(r["name"]) != str:
-        response_body["msg"] = "Name must be a string"
-        return jsonify(response_body), 400
-    
-    if type(r["cargo_capacity"]) != int:
-        response_body["msg"] = "Cargo capacity must be a integer"
-        return jsonify(response_body), 400
-
-    if type(r["consumables"]) != str:
-        response_body["msg"] = "Consumables must be a string"
-        return jsonify(response_body), 400
-
-    if type(r["cost_in_credits"]) != int:
-        response_body["msg"] = "Cost in credits must be a integer"
-        return jsonify(response_body), 400
-    
-    if type(r["crew"]) != int:
-        response_body["msg"] = "Crew must be a integer"
-        return jsonify(response_body), 400
-    
-    if type(r["length"]) != int:
-        response_body["msg"] = "Length must be a integer"
-        return jsonify(response_body), 400
-
-    if type(r["manufacturer"]) != str:
-        response_body["msg"] = "Manufacturer must be a string"
-        return jsonify(response_body), 400
-    
-    if type(r["max_atmosphering_speed"]) != int:
-        response_body["msg"] = "Max atmosphering speed capacity must be a integer"
-        return jsonify(response_body), 400
-
-    if type(r["model"]) != str:
-        response_body["msg"] = "Model must be a string"
-        return jsonify(response_body), 400
-    
-    if type(r["vehicle_class"]) != str:
-        response_body["msg"] = "Vehicle class must be a string"
-        return jsonify(response_body), 400
-
-    if type(r["passengers"]) != int:
-        response_body["msg"] = "Passengers capacity must be a integer"
-        return jsonify(response_body), 400
-    
     # Check unique name
-    filter_name = Vehicles.query.filter_by(
-        name=r["name"]).first() 
-    
+    filter_name = Vehicles.query.filter_by(name=r["name"]).first()
+
     if filter_name != None:
         response_body["msg"] = "Name must be unique"
         return jsonify(response_body), 400
-    
-   
+
     # Insert in table
-    vehicle = Vehicles(name=r["name"], model=r["model"], vehicle_class=r["vehicle_class"],
-                       manufacturer=r["manufacturer"], cost_in_credits=r["cost_in_credits"],
-                       length=r["length"], crew=r["crew"], passengers=r["passengers"],
-                       max_atmosphering_speed=r["max_atmosphering_speed"],
-                       cargo_capacity=r["cargo_capacity"], consumables=r["consumables"])
+    vehicle = Vehicles(**SCHEMAS[Vehicles].values(r))
 
     db.session.add(vehicle)
     db.session.commit()
@@ -377,97 +322,22 @@ def planets_post():
 
     r = request.get_json(force=True)
 
-    # Check if empty
-    if r is None:
-        return "The request body is null", 400
-
-    # Check if propierties exists
-    if not "name" in r:
-        response_body["msg"] = "Name not found"
-        return jsonify(response_body), 400
-
-    if not "climate" in r:
-        response_body["msg"] = "Climate not found"
-        return jsonify(response_body), 400
-
-    if not "diameter" in r:
-        response_body["msg"] = "Diameter not found"
-        return jsonify(response_body), 400
-
-    if not "gravity" in r:
-        response_body["msg"] = "Gravity in credits color not found"
-        return jsonify(response_body), 400
-
-    if not "orbital_period" in r:
-        response_body["msg"] = "Orbital period not found"
-        return jsonify(response_body), 400
-
-    if not "population" in r:
-        response_body["msg"] = "Population color not found"
-        return jsonify(response_body), 400
-
-    if not "rotation_period" in r:
-        response_body["msg"] = "Rotation period year not found"
-        return jsonify(response_body), 400
-
-    if not "surface_water" in r:
-        response_body["msg"] = "Surface water speed year not found"
-        return jsonify(response_body), 400
-
-    if not "terrain" in r:
-        response_body["msg"] = "Terrain year not found"
-        return jsonify(response_body), 400
-
-    # Check types
-
-    if type(r["name"]) != str:
-        response_body["msg"] = "Name must be a string"
-        return jsonify(response_body), 400
-    
-    if type(r["climate"]) != str:
-        response_body["msg"] = "Climate must be a string"
-        return jsonify(response_body), 400
-
-    if type(r["gravity"]) != str:
-        response_body["msg"] = "Gravity must be a string"
-        return jsonify(response_body), 400
-
-    if type(r["terrain"]) != str:
-        response_body["msg"] = "Terrain must be a string"
-        return jsonify(response_body), 400
-
-    if type(r["diameter"]) != int:
-        response_body["msg"] = "Diameter must be a integer"
-        return jsonify(response_body), 400
-
-    if type(r["orbital_period"]) != int:
-        response_body["msg"] = "Orbital period must be a integer"
-        return jsonify(response_body), 400
-
-    if type(r["population"]) != int:
-        response_body["msg"] = "Population must be a integer"
-        return jsonify(response_body), 400
-    
-    if type(r["rotation_period"]) != int:
-        response_body["msg"] = "Rotation period must be a integer"
-        return jsonify(response_body), 400
-    
-    if type(r["surface_water"]) != int:
-        response_body["msg"] = "Surface water must be a integer"
+    # Check propierties and their types
+    errors = SCHEMAS[Planets].validate(r)
+    if errors:
+        response_body["msg"] = errors[0]
+        response_body["errors"] = errors
         return jsonify(response_body), 400
 
     # Check unique name
-    filter_name = Planets.query.filter_by(
-        name=r["name"]).first()  
+    filter_name = Planets.query.filter_by(name=r["name"]).first()
+
     if filter_name != None:
         response_body["msg"] = "Name must be unique"
         return jsonify(response_body), 400
-    
 
-    planet = Planets(name=r["name"], climate=r["climate"], diameter=r["diameter"],
-                     gravity=r["gravity"], orbital_period=r["orbital_period"],
-                     population=r["population"], rotation_period=r["rotation_period"],
-                     surface_water=r["surface_water"], terrain=r["terrain"])
+    # Insert in table
+    planet = Planets(**SCHEMAS[Planets].values(r))
 
     db.session.add(planet)
     db.session.commit()
@@ -476,6 +346,20 @@ def planets_post():
     return jsonify(response_body), 200
 
 
+# BULK POST
+@app.route('/people/bulk', methods=['POST'])
+def people_bulk_post():
+    return bulk_create(People)
+
+@app.route('/vehicles/bulk', methods=['POST'])
+def vehicles_bulk_post():
+    return bulk_create(Vehicles)
+
+@app.route('/planets/bulk', methods=['POST'])
+def planets_bulk_post():
+    return bulk_create(Planets)
+
+
 # DELETE PEOPLE
 @app.route('/people/<int:id>', methods=['DELETE'])
 def delete_people(id):
@@ -515,7 +399,7 @@ def delete_vehicles(id):
 def delete_planets(id):
     response_body = {}
 
-    planet = People.query.get(id)
+    planet = Planets.query.get(id)
 
     if planet == None:
         response_body["msg"] = f"Planet with id {id} doesn't exist"
@@ -541,64 +425,23 @@ def modify_people(id):
         response_body["msg"] = f"Person with id {id} doesn't exist"
         return jsonify(response_body), 400
 
-    # Check if propierties exists on request && type of them
-    if "name" in r:
-        if type(r["name"]) != str:
-            response_body["msg"] = f"Name {r['name']} must be a string"
-            return jsonify(response_body), 400
+    # Check propierties on request && type of them
+    errors = SCHEMAS[People].validate(r, partial=True)
+    if errors:
+        response_body["msg"] = errors[0]
+        response_body["errors"] = errors
+        return jsonify(response_body), 400
 
-        # Check unique name
-        filter_name = People.query.filter_by(
-        name=r["name"]).first()
+    # Check unique name
+    if "name" in r:
+        filter_name = People.query.filter(People.name == r["name"], People.id != id).first()
 
         if filter_name != None:
             response_body["msg"] = f"Name {r['name']} already exist"
             return jsonify(response_body), 400
-        
-        person.name = r["name"]
-
-    if "birth_year" in r:
-        if type(r["birth_year"]) != str:
-            response_body["msg"] = f"Birth year {r['birth_year']} must be a string"
-            return jsonify(response_body), 400
-
-        person.birth_year = r["birth_year"]
-
-    if "eye_color" in r:
-        if type(r["eye_color"]) != str:
-            response_body["msg"] = f"Eye color {r['eye_color']} must be a string"
-            return jsonify(response_body), 400
-        
-        person.eye_color = r["eye_color"]
-
-    if "gender" in r:
-        if type(r["gender"]) != str:
-            response_body["msg"] = f"Gender {r['gender']} must be a string"
-            return jsonify(response_body), 400
-        
-        person.gender = r["gender"]
-
-    if "hair_color" in r:
-        if type(r["hair_color"]) != str:
-            response_body["msg"] = f"Hair color {r['hair_color']} must be a string"
-            return jsonify(response_body), 400
-        
-        person.hair_color = r["hair_color"]
-
-    if "height" in r:
-        if type(r["height"]) != int:
-            response_body["msg"] = f"Height {r['height']} must be a integer"
-            return jsonify(response_body), 400
-        
-        person.height = r["height"]
-
-    if "mass" in r:
-        if type(r["mass"]) != int:
-            response_body["msg"] = f"Mass {r['mass']} must be a integer"
-            return jsonify(response_body), 400
-        
-        person.mass = r["mass"]
 
+    for field, value in SCHEMAS[People].values(r).items():
+        setattr(person, field, value)
 
     db.session.commit()
 
@@ -619,91 +462,23 @@ def modify_vehicles(id):
         response_body["msg"] = f"Vehicle with id {id} doesn't exist"
         return jsonify(response_body), 400
 
-    # Check if propierties exists on request && type of them
+    # Check propierties on request && type of them
+    errors = SCHEMAS[Vehicles].validate(r, partial=True)
+    if errors:
+        response_body["msg"] = errors[0]
+        response_body["errors"] = errors
+        return jsonify(response_body), 400
+
+    # Check unique name
     if "name" in r:
-        if type(r["name"]) != str:
-            response_body["msg"] = f"Name {r['name']} must be a string"
-            return jsonify(response_body), 400
-        
-        # Check unique name
-        filter_name = Vehicles.query.filter_by(
-        name=r["name"]).first()
-    
+        filter_name = Vehicles.query.filter(Vehicles.name == r["name"], Vehicles.id != id).first()
+
         if filter_name != None:
             response_body["msg"] = f"Name {r['name']} already exist"
             return jsonify(response_body), 400
-        
-        vehicle.name = r["name"]
-
-    if "cargo_capacity" in r:
-        if type(r["cargo_capacity"]) != int:
-            response_body["msg"] = f"Cargo capacity {r['cargo_capacity']} must be a integer"
-            return jsonify(response_body), 400
-        
-        vehicle.cargo_capacity = r["cargo_capacity"]
-
-    if "consumables" in r:
-        if type(r["consumables"]) != str:
-            response_body["msg"] = f"Consumables {r['consumables']} must be a string"
-            return jsonify(response_body), 400
-
-        vehicle.consumables = r["consumables"]
-
-    if "cost_in_credits" in r:
-        if type(r["cost_in_credits"]) != int:
-            response_body["msg"] = f"Cost in credits {r['cost_in_credits']} must be a integer"
-            return jsonify(response_body), 400
-        
-        vehicle.cost_in_credits = r["cost_in_credits"]
-
-    if "crew" in r:
-        if type(r["crew"]) != int:
-            response_body["msg"] = f"Crew {r['crew']} must be a integer"
-            return jsonify(response_body), 400
-        
-        vehicle.crew = r["crew"]
 
-    if "length" in r:
-        if type(r["length"]) != int:
-            response_body["msg"] = f"Length {r['length']} must be a integer"
-            return jsonify(response_body), 400
-        
-        vehicle.length = r["length"]
-
-    if "manufacturer" in r:
-        if type(r["manufacturer"]) != str:
-            response_body["msg"] = f"Manufacturer {r['manufacturer']} must be a string"
-            return jsonify(response_body), 400
-        
-        vehicle.manufacturer = r["manufacturer"]
-
-    if "max_atmosphering_speed" in r:
-        if type(r["max_atmosphering_speed"]) != int:
-            response_body["msg"] = f"Max atmosphering speed {r['max_atmosphering_speed']} must be a integer"
-            return jsonify(response_body), 400
-        
-        vehicle.max_atmosphering_speed = r["max_atmosphering_speed"]
-
-    if "model" in r:
-        if type(r["model"]) != str:
-            response_body["msg"] = f"Model {r['model']} must be a string"
-            return jsonify(response_body), 400
-        
-        vehicle.model = r["model"]
-
-    if "passengers" in r:
-        if type(r["passengers"]) != int:
-            response_body["msg"] = f"Passengers {r['passengers']} must be a integer"
-            return jsonify(response_body), 400
-        
-        vehicle.passengers = r["passengers"]
-
-    if "vehicle_class" in r:
-        if type(r["vehicle_class"]) != str:
-            response_body["msg"] = f"Vehicle class {r['vehicle_class']} must be a string"
-            return jsonify(response_body), 400
-        
-        vehicle.vehicle_class = r["vehicle_class"]
+    for field, value in SCHEMAS[Vehicles].values(r).items():
+        setattr(vehicle, field, value)
 
     db.session.commit()
 
@@ -723,77 +498,23 @@ def modify_planets(id):
         response_body["msg"] = f"Planet with id {id} doesn't exist"
         return jsonify(response_body), 400
 
-    # Check if propierties exists on request && type of them
+    # Check propierties on request && type of them
+    errors = SCHEMAS[Planets].validate(r, partial=True)
+    if errors:
+        response_body["msg"] = errors[0]
+        response_body["errors"] = errors
+        return jsonify(response_body), 400
+
+    # Check unique name
     if "name" in r:
-        if type(r["name"]) != str:
-            response_body["msg"] = f"Name class {r['name']} must be a string"
-            return jsonify(response_body), 400
-        
-        # Check unique name
-        filter_name = Planets.query.filter_by(
-        name=r["name"]).first()  
-    
+        filter_name = Planets.query.filter(Planets.name == r["name"], Planets.id != id).first()
+
         if filter_name != None:
             response_body["msg"] = f"Name {r['name']} already exist"
             return jsonify(response_body), 400
 
-        planet.name = r["name"]
-
-    if "climate" in r:
-        if type(r["climate"]) != str:
-            response_body["msg"] = f"Climate class {r['climate']} must be a string"
-            return jsonify(response_body), 400
-        
-        planet.climate = r["climate"]
-
-    if "diameter" in r:
-        if type(r["diameter"]) != int:
-            response_body["msg"] = f"Diameter class {r['diameter']} must be a integer"
-            return jsonify(response_body), 400
-        
-        planet.diameter = r["diameter"]
-
-    if "gravity" in r:
-        if type(r["gravity"]) != str:
-            response_body["msg"] = f"Gravity class {r['gravity']} must be a string"
-            return jsonify(response_body), 400
-        
-        planet.gravity = r["gravity"]
-
-    if "orbital_period" in r:
-        if type(r["orbital_period"]) != int:
-            response_body["msg"] = f"Orbital period class {r['orbital_period']} must be a integer"
-            return jsonify(response_body), 400
-        
-        planet.orbital_period = r["orbital_period"]
-
-    if "population" in r:
-        if type(r["population"]) != int:
-            response_body["msg"] = f"Population class {r['population']} must be a integer"
-            return jsonify(response_body), 400
-        
-        planet.population = r["population"]
-
-    if "rotation_period" in r:
-        if type(r["rotation_period"]) != int:
-            response_body["msg"] = f"Rotation period class {r['rotation_period']} must be a integer"
-            return jsonify(response_body), 400
-        
-        planet.rotation_period = r["rotation_period"]
-
-    if "surface_water" in r:
-        if type(r["surface_water"]) != int:
-            response_body["msg"] = f"Surface water class {r['surface_water']} must be a integer"
-            return jsonify(response_body), 400
-
-        planet.surface_water = r["surface_water"]
-
-    if "terrain" in r:
-        if type(r["terrain"]) != str:
-            response_body["msg"] = f"Terrain class {r['terrain']} must be a string"
-            return jsonify(response_body), 400
-        
-        planet.terrain = r["terrain"]
+    for field, value in SCHEMAS[Planets].values(r).items():
+        setattr(planet, field, value)
 
     db.session.commit()
 
@@ -803,6 +524,8 @@ def modify_planets(id):
 
 # GET USER FAVOURITES
 @app.route('/users/favorites/<int:id>', methods=['GET'])
+@etagged("users", "favourites_people", "favourites_vehicles", "favourites_planets", "people", "vehicles", "planets",
+         vary=["Accept-Version"])
 def get_favourites(id):
     response_body = {}
 
@@ -811,14 +534,27 @@ def get_favourites(id):
         response_body["msg"] = f"Not Found. User with id {id} doesn't exist"
         return jsonify(response_body), 404
 
-    favourites_people = list(map(lambda item: item.serialize(
-    ), Favourites_people.query.filter_by(user_id=id).all()))
+    # One query per favourites table with the target joined in, and the
+    # user serialized once for every entry.
+    user_info = user.serialize()
+
+    if wants_compact():
+        favourites = compact_favourites(user_info)
+        if favourites is None:
+            return jsonify(response_body), 204  # No content
 
-    favourites_vehicles = list(map(lambda item: item.serialize(
-    ), Favourites_vehicles.query.filter_by(user_id=id).all()))
+        response_body["msg"] = "Ok"
+        response_body["response"] = favourites
+        return jsonify(response_body), 200
 
-    favourites_planets = list(map(lambda item: item.serialize(
-    ), Favourites_planets.query.filter_by(user_id=id).all()))
+    favourites_people = list(map(lambda item: item.serialize(user_info), Favourites_people.query.options(
+        joinedload(Favourites_people.people)).filter_by(user_id=id).all()))
+
+    favourites_vehicles = list(map(lambda item: item.serialize(user_info), Favourites_vehicles.query.options(
+        joinedload(Favourites_vehicles.vehicles)).filter_by(user_id=id).all()))
+
+    favourites_planets = list(map(lambda item: item.serialize(user_info), Favourites_planets.query.options(
+        joinedload(Favourites_planets.planets)).filter_by(user_id=id).all()))
 
     favourites = [*favourites_people, *
                   favourites_vehicles, *favourites_planets]
@@ -848,19 +584,15 @@ def post_favourite_person(people_id,user_id):
         response_body["msg"] = f"Person with id {people_id} doesn't exist"
         return jsonify(response_body), 404
     
-    # Check if person favourites already exist with the same user.
-    person_user= Favourites_people.query.filter_by(user_id=user_id,person_id=people_id).first()  # AND FILTER
-
-    if person_user != None:
+    # Insert unless the unique (user, person) index already has the pair
+    created = insert_ignore(Favourites_people, [{"user_id": user_id, "person_id": people_id}])
+    # The message is built before the commit, which expires user and person
+    if created:
+        response_body["msg"] = "Ok"
+    else:
         response_body["msg"] = f"User {user.user_name} with favorite person {person.name} already exist"
-        return jsonify(response_body), 400
-
-    favourite=Favourites_people(user_id=user_id,person_id=people_id)
-
-    db.session.add(favourite)
+    response_body["created"] = bool(created)
     db.session.commit()
-
-    response_body["msg"] = "Ok"
     return jsonify(response_body), 200
 
 # POST VEHICLE FAVORITE
@@ -880,19 +612,15 @@ def post_favourite_vehicle(vehicle_id,user_id):
         response_body["msg"] = f"Vehicle with id {vehicle_id} doesn't exist"
         return jsonify(response_body), 404
     
-    # Check if person favourites already exist with the same user.
-    vehicle_user= Favourites_vehicles.query.filter_by(user_id=user_id,vehicles_id=vehicle_id).first()  # AND FILTER
-
-    if vehicle_user != None:
+    # Insert unless the unique (user, vehicle) index already has the pair
+    created = insert_ignore(Favourites_vehicles, [{"user_id": user_id, "vehicles_id": vehicle_id}])
+    # The message is built before the commit, which expires user and vehicle
+    if created:
+        response_body["msg"] = "Ok"
+    else:
         response_body["msg"] = f"User {user.user_name} with favorite vehicle {vehicle.name} already exist"
-        return jsonify(response_body), 400
-
-    favourite=Favourites_vehicles(user_id=user_id,vehicles_id=vehicle_id)
-
-    db.session.add(favourite)
+    response_body["created"] = bool(created)
     db.session.commit()
-
-    response_body["msg"] = "Ok"
     return jsonify(response_body), 200
 
 # POST PLANET FAVORITE
@@ -912,21 +640,22 @@ def post_favourite_planet(planet_id,user_id):
         response_body["msg"] = f"Planets with id {planet_id} doesn't exist"
         return jsonify(response_body), 404
     
-    # Check if person favourites already exist with the same user.
-    planet_user= Favourites_planets.query.filter_by(user_id=user_id,planets_id=planet_id).first()  # AND FILTER
-
-    if planet_user != None:
+    # Insert unless the unique (user, planet) index already has the pair
+    created = insert_ignore(Favourites_planets, [{"user_id": user_id, "planets_id": planet_id}])
+    # The message is built before the commit, which expires user and planet
+    if created:
+        response_body["msg"] = "Ok"
+    else:
         response_body["msg"] = f"User {user.user_name} with favorite planet {planet.name} already exist"
-        return jsonify(response_body), 400
-
-    favourite=Favourites_planets(user_id=user_id,planets_id=planet_id)
-
-    db.session.add(favourite)
+    response_body["created"] = bool(created)
     db.session.commit()
-
-    response_body["msg"] = "Ok"
     return jsonify(response_body), 200
 
+# BULK FAVORITES
+@app.route('/favorite/bulk/<int:user_id>', methods=['POST'])
+def bulk_favourites_post(user_id):
+    return bulk_favourites(user_id)
+
 # DELETE PERSON FAVORITE
 @app.route('/favorite/people/<int:people_id>/<int:user_id>', methods=['DELETE'])
 def delete_favourite_people(people_id,user_id):
@@ -0,0 +1,216 @@
+"""
+ASGI entry point, next to wsgi.py:
+
+    uvicorn asgi:application --app-dir src --workers 2
+    gunicorn asgi:application --chdir src -k uvicorn.workers.UvicornWorker
+
+The catalog reads (GET /people, /vehicles, /planets and their /<id>) run on
+the event loop with SQLAlchemy's asyncio extension (asyncpg, aiosqlite or
+aiomysql), so a process keeps serving while those queries wait on the
+database. Every other request, and streamed exports, go to the Flask app
+on a thread pool of ASGI_WSGI_THREADS threads.
+
+The async views build their queries with the same helpers as the Flask views
+(fields, filters, sort, cursors) inside a Flask request context, and their
+responses go through the app's after_request hooks, so both paths answer the
+same bytes and headers. The cache calls (versions, lookups) go to a thread
+when the backend is SQLite or Redis, so they don't block the event loop.
+"""
+import asyncio
+import re
+from a2wsgi import WSGIMiddleware
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+from werkzeug.test import EnvironBuilder
+from app import app
+from cache import cache
+from etag import request_etag, not_modified
+from filters import apply_filters, requested_sort
+from models import db, People, Vehicles, Planets
+from pool import engine_options
+from replicas import replica_keys, reads_from_primary, pick_replica
+from serialization import select_columns, to_dicts, requested_fields
+from utils import page_query, page_result, wants_stream
+
+ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite", "mysql": "mysql+aiomysql"}
+
+MODELS = {"people": People, "vehicles": Vehicles, "planets": Planets}
+
+NOT_FOUND = {
+    People: "Not found. Person with id {id} doesn't exist",
+    Vehicles: "Vehicle with id {id} doesn't exist",
+    Planets: "Planet with id {id} doesn't exist",
+}
+
+COLLECTION = re.compile(r"^/(people|vehicles|planets)/?$")
+ITEM = re.compile(r"^/(people|vehicles|planets)/(\d+)/?$")
+
+
+def async_url(url):
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if not backend in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver for {backend}, use postgresql, sqlite or mysql")
+    url = url.set(drivername=ASYNC_DRIVERS[backend])
+    if backend == "postgresql" and "sslmode" in url.query:
+        # asyncpg calls it ssl
+        url = url.update_query_dict({"ssl": url.query["sslmode"]}).difference_update_query(["sslmode"])
+    return url
+
+
+def async_engine_options(config):
+    options = {key: value for key, value in engine_options(config).items() if not key in ("poolclass", "connect_args")}
+    if config["SQLALCHEMY_DATABASE_URI"].startswith("postgresql") and config["DB_STATEMENT_TIMEOUT"]:
+        options["connect_args"] = {"server_settings": {"statement_timeout": str(config["DB_STATEMENT_TIMEOUT"])}}
+    return options
+
+
+def request_environ(scope):
+    headers = [(name.decode("latin-1"), value.decode("latin-1")) for name, value in scope["headers"]]
+    host = dict(headers).get("host", "localhost")
+    builder = EnvironBuilder(
+        path=scope.get("root_path", "") + scope["path"], query_string=scope["query_string"].decode("latin-1"),
+        method=scope["method"], headers=headers, base_url=f"{scope['scheme']}://{host}",
+        environ_base={"REMOTE_ADDR": scope["client"][0] if scope.get("client") else ""})
+    try:
+        return builder.get_environ()
+    finally:
+        builder.close()
+
+
+class ASGIApp:
+    def __init__(self, flask_app):
+        self.app = flask_app
+        self.wsgi = WSGIMiddleware(flask_app, workers=flask_app.config["ASGI_WSGI_THREADS"])
+        options = async_engine_options(flask_app.config)
+        self.engines = {None: create_async_engine(async_url(flask_app.config["SQLALCHEMY_DATABASE_URI"]), **options)}
+        for key in replica_keys(flask_app):
+            self.engines[key] = create_async_engine(async_url(flask_app.config["SQLALCHEMY_BINDS"][key]), **options)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self.lifespan(receive, send)
+
+        if scope["type"] == "http" and scope["method"] == "GET":
+            collection = COLLECTION.match(scope["path"])
+            item = ITEM.match(scope["path"])
+            if collection or item:
+                environ = request_environ(scope)
+                response = await self.read(environ, MODELS[(collection or item).group(1)],
+                                           int(item.group(2)) if item else None)
+                if response is not None:
+                    return await self.send_response(response, environ, send)
+
+        await self.wsgi(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                for engine in self.engines.values():
+                    await engine.dispose()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def read(self, environ, model, id):
+        """The response of a catalog read, None to let Flask answer it."""
+        with self.app.request_context(environ):
+            try:
+                if id is None and wants_stream():
+                    return None
+                # The replica of the request, by the load of the async engines, and
+                # kept where request_etag() looks: no ETag when it isn't the primary
+                db.session().info["replica"] = self.pick_replica()
+                # before_request hooks, then the same steps as an @etagged view
+                response = self.app.preprocess_request()
+                etag = await self.blocking(request_etag, [model.__tablename__])
+                if response is None and etag is not None:
+                    response = not_modified(etag)
+                if response is None:
+                    if id is None:
+                        response = self.app.make_response(await self.get_all(model))
+                    else:
+                        response = self.app.make_response(await self.get_one(model, id))
+                    if response.status_code == 200 and etag is not None:
+                        response.set_etag(etag)
+                response = self.app.make_response(response)
+            except Exception as e:
+                try:
+                    response = self.app.make_response(self.app.handle_user_exception(e))
+                except Exception as e:
+                    response = self.app.handle_exception(e)
+            return self.app.process_response(response)
+
+    def pick_replica(self):
+        keys = [key for key in self.engines if key is not None]
+        if not keys or reads_from_primary():
+            return None
+        return pick_replica(self.engines, keys, self.app.config["REPLICA_STRATEGY"])
+
+    def engine(self):
+        return self.engines[db.session().info["replica"]]
+
+    async def blocking(self, function, *args):
+        """Run a cache call off the event loop when it goes to SQLite or Redis."""
+        if not cache.backend.shared:
+            return function(*args)
+        return await asyncio.to_thread(function, *args)
+
+    async def get_all(self, model):
+        response_body = {}
+        sort = requested_sort(model)
+        query = apply_filters(select_columns(model, requested_fields(model, sort)), model)
+        query, limit = page_query(query, model, sort)
+        async with self.engine().connect() as conn:
+            rows = (await conn.execute(query.statement)).all()
+        rows, next_cursor = page_result(rows, limit, sort)
+
+        if not rows:
+            return response_body, 204  # No content
+
+        response_body["msg"] = "Ok"
+        response_body["response"] = to_dicts(rows)
+        response_body["next"] = next_cursor
+        return response_body, 200
+
+    async def get_one(self, model, id):
+        response_body = {}
+        fields = requested_fields(model)
+
+        # Same cache entries as get_serialized(): a full row is cached (and
+        # read from the primary), a projection is only read
+        def lookup():
+            key = cache.key(model, id)
+            return key, cache.lookup(key)
+
+        key, value = await self.blocking(lookup)
+        if value is not None and fields is not None:
+            value = {field: value[field] for field in fields}
+        elif value is None:
+            engine = self.engines[None] if fields is None else self.engine()
+            async with engine.connect() as conn:
+                row = (await conn.execute(select_columns(model, fields).filter(model.id == id).statement)).first()
+            if row is not None:
+                value = dict(zip(row._fields, row))
+                if fields is None:
+                    await self.blocking(cache.backend.set, key, value)
+
+        if value is None:
+            response_body["msg"] = NOT_FOUND[model].format(id=id)
+            return response_body, 404
+
+        response_body["msg"] = "Ok"
+        response_body["response"] = value
+        return response_body, 200
+
+    async def send_response(self, response, environ, send):
+        # What werkzeug would send over WSGI: no body nor Content-Length for 204, no body for 304
+        body, status, headers = response.get_wsgi_response(environ)
+        headers = [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers]
+        await send({"type": "http.response.start", "status": response.status_code, "headers": headers})
+        await send({"type": "http.response.body", "body": b"".join(body)})
+
+
+application = ASGIApp(app)
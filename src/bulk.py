@@ -0,0 +1,177 @@
+"""
+Batch endpoints: inserts for the catalog tables (people, vehicles, planets)
+and add/remove of a user's favourites
+"""
+import json
+from flask import request, jsonify, current_app
+from sqlalchemy import insert, delete
+from models import db, Users, FAVOURITE_KINDS, insert_ignore
+from utils import APIException
+from validation import SCHEMAS
+
+
+def read_items():
+    """Items of a bulk request, sent either as a JSON array or as NDJSON."""
+    if request.mimetype == "application/x-ndjson":
+        try:
+            items = [json.loads(line) for line in request.get_data(as_text=True).splitlines() if line.strip()]
+        except ValueError:
+            raise APIException("The request body is not valid NDJSON", status_code=400)
+    else:
+        items = request.get_json(force=True, silent=True)
+
+    if type(items) != list:
+        raise APIException("The request body must be a list", status_code=400)
+    if not items:
+        raise APIException("The request body is empty", status_code=400)
+    if len(items) > current_app.config["BULK_MAX_ITEMS"]:
+        raise APIException(f"A bulk request accepts at most {current_app.config['BULK_MAX_ITEMS']} items", status_code=400)
+    return items
+
+
+def bulk_create(model):
+    """
+    Validate every item, check name uniqueness against the table with a single
+    IN query (and against the other items of the batch), then insert all valid
+    rows with one executemany in one transaction. Returns one result per item.
+    """
+    schema = SCHEMAS[model]
+    items = read_items()
+    results = [None] * len(items)
+
+    valid = []
+    for index, item in enumerate(items):
+        errors = schema.validate(item)
+        if errors:
+            results[index] = {"index": index, "status": "error", "msg": errors[0], "errors": errors}
+        else:
+            valid.append((index, item))
+
+    names = [item["name"] for index, item in valid]
+    taken = set(name for (name,) in db.session.query(model.name).filter(model.name.in_(names)))
+
+    rows = []
+    for index, item in valid:
+        if item["name"] in taken:
+            results[index] = {"index": index, "status": "error", "msg": "Name must be unique"}
+            continue
+        taken.add(item["name"])
+        rows.append((index, schema.values(item)))
+
+    if rows:
+        values = [row for index, row in rows]
+        if db.session.get_bind().dialect.insert_executemany_returning_sort_by_parameter_order:
+            ids = db.session.scalars(insert(model).returning(model.id, sort_by_parameter_order=True), values).all()
+        else:
+            # No RETURNING (MySQL): the names are unique, read the new ids back by name
+            db.session.execute(insert(model), values)
+            new_ids = dict(db.session.query(model.name, model.id).filter(model.name.in_([row["name"] for row in values])))
+            ids = [new_ids[row["name"]] for row in values]
+        db.session.commit()
+
+        for (index, row), id in zip(rows, ids):
+            results[index] = {"index": index, "status": "created", "id": id}
+
+    response_body = {
+        "msg": "Ok" if rows else "No items were created",
+        "created": len(rows),
+        "errors": len(items) - len(rows),
+        "response": results,
+    }
+    return jsonify(response_body), 200 if rows else 400
+
+
+FAVOURITE_LABELS = {"people": "Person", "vehicle": "Vehicle", "planet": "Planet"}
+
+
+def read_favourite_items(r, action):
+    items = r.get(action, [])
+    if type(items) != list:
+        raise APIException(f"{action.capitalize()} must be a list", status_code=400)
+
+    results = [None] * len(items)
+    ids = {kind: [] for kind in FAVOURITE_KINDS}
+    for index, item in enumerate(items):
+        if type(item) != dict or not "kind" in item or not "target_id" in item:
+            results[index] = {"index": index, "status": "error", "msg": "Item must have a kind and a target_id"}
+        elif type(item["kind"]) != str or not item["kind"] in FAVOURITE_KINDS:
+            results[index] = {"index": index, "status": "error", "msg": f"Kind {item['kind']} doesn't exist"}
+        elif type(item["target_id"]) != int:
+            results[index] = {"index": index, "status": "error", "msg": "Target id must be an integer"}
+        else:
+            ids[item["kind"]].append(item["target_id"])
+    return items, results, ids
+
+
+def bulk_favourites(user_id):
+    """
+    Add and remove many favourites of one user. Target existence and current
+    favourites are resolved with two IN queries per kind, then every delete and
+    insert is applied in one transaction.
+    """
+    response_body = {}
+
+    user = Users.query.get(user_id)
+    if user == None:
+        response_body["msg"] = f"User with id {user_id} doesn't exist"
+        return jsonify(response_body), 404
+
+    r = request.get_json(force=True, silent=True)
+    if type(r) != dict:
+        raise APIException("The request body must be an object with add and/or remove lists", status_code=400)
+
+    add_items, add_results, add_ids = read_favourite_items(r, "add")
+    remove_items, remove_results, remove_ids = read_favourite_items(r, "remove")
+    if len(add_items) + len(remove_items) > current_app.config["BULK_MAX_ITEMS"]:
+        raise APIException(f"A bulk request accepts at most {current_app.config['BULK_MAX_ITEMS']} items", status_code=400)
+
+    for kind, (model, favourite_model, column) in FAVOURITE_KINDS.items():
+        ids = set(add_ids[kind]) | set(remove_ids[kind])
+        if not ids:
+            continue
+        target_column = getattr(favourite_model, column)
+
+        found = set(id for (id,) in db.session.query(model.id).filter(model.id.in_(ids)))
+        favourites = set(id for (id,) in db.session.query(target_column).filter(
+            favourite_model.user_id == user_id, target_column.in_(ids)))
+
+        deleted = set()
+        for index, item in enumerate(remove_items):
+            if remove_results[index] is not None or item["kind"] != kind:
+                continue
+            target_id = item["target_id"]
+            if not target_id in found:
+                msg = f"{FAVOURITE_LABELS[kind]} with id {target_id} doesn't exist"
+                remove_results[index] = {"index": index, "status": "error", "msg": msg}
+            elif not target_id in favourites and not target_id in deleted:
+                msg = f"Favorite {kind} {target_id} with user {user.user_name} doesn't exist"
+                remove_results[index] = {"index": index, "status": "error", "msg": msg}
+            else:
+                deleted.add(target_id)
+                remove_results[index] = {"index": index, "status": "deleted"}
+
+        created = set()
+        for index, item in enumerate(add_items):
+            if add_results[index] is not None or item["kind"] != kind:
+                continue
+            target_id = item["target_id"]
+            if not target_id in found:
+                msg = f"{FAVOURITE_LABELS[kind]} with id {target_id} doesn't exist"
+                add_results[index] = {"index": index, "status": "error", "msg": msg}
+            elif (target_id in favourites and not target_id in deleted) or target_id in created:
+                add_results[index] = {"index": index, "status": "exists"}
+            else:
+                created.add(target_id)
+                add_results[index] = {"index": index, "status": "created"}
+
+        if deleted:
+            db.session.execute(delete(favourite_model).where(
+                favourite_model.user_id == user_id, target_column.in_(deleted)))
+        if created:
+            insert_ignore(favourite_model, [{"user_id": user_id, column: target_id} for target_id in created])
+
+    db.session.commit()
+
+    response_body["msg"] = "Ok"
+    response_body["response"] = {"add": add_results, "remove": remove_results}
+    return jsonify(response_body), 200
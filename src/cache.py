@@ -0,0 +1,280 @@
+"""
+Read-through cache for the serialized catalog rows served by the GET-by-id endpoints.
+
+Keys are stamped with a per-table version that is bumped on every commit writing
+to that table, so a write makes all cached rows of the table unreachable. With a
+shared backend (SQLite file or Redis) the versions are shared as well, which is
+what makes a PUT/DELETE handled by one gunicorn worker invalidate the others.
+"""
+import json
+import os
+import sqlite3
+import time
+import uuid
+from collections import OrderedDict
+from threading import Lock, local
+from flask import jsonify
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from models import db
+from serialization import get_projected
+
+
+class MemoryBackend:
+    """
+    Thread safe LRU with a time to live, local to the process. Memory is bounded
+    by `max_entries`: inserting past it evicts the least recently used entry.
+    """
+    name = "memory"
+    # Versions only see the writes of this process
+    shared = False
+
+    def __init__(self, max_entries=10000, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.versions = {}
+        self.lock = Lock()
+        self.evictions = 0
+        # Versions are per process here: prefix them so two workers never hand
+        # out the same version (and so the same ETag) for different data.
+        self.instance = uuid.uuid4().hex[:8]
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_version(self, name):
+        return f"{self.instance}.{self.versions.get(name, 0)}"
+
+    def incr_version(self, name):
+        with self.lock:
+            self.versions[name] = self.versions.get(name, 0) + 1
+
+    def stats(self):
+        return {"entries": len(self.entries), "evictions": self.evictions}
+
+
+class SQLiteBackend:
+    """
+    Cache shared by every process of the host through a SQLite file in WAL mode.
+    Expired rows are purged, and the oldest trimmed past `max_entries`, every
+    `PRUNE_EVERY` writes.
+    """
+    name = "sqlite"
+    shared = True
+    PRUNE_EVERY = 1000
+
+    def __init__(self, path, max_entries=10000, ttl=300):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.local = local()
+        self.writes = 0
+        conn = self.connection()
+        conn.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)")
+        conn.execute("CREATE TABLE IF NOT EXISTS versions (name TEXT PRIMARY KEY, version INTEGER NOT NULL)")
+        # Random start for the versions of this file, so deleting it never
+        # brings back versions (and ETags) that were handed out before
+        conn.execute("INSERT OR IGNORE INTO versions (name, version) VALUES ('__epoch__', ?)", (uuid.uuid4().int >> 96,))
+        self.epoch = conn.execute("SELECT version FROM versions WHERE name = '__epoch__'").fetchone()[0]
+
+    def connection(self):
+        # One connection per thread, and a new one after a fork (gunicorn --preload)
+        conn = getattr(self.local, "conn", None)
+        if conn is None or self.local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+            self.local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        row = self.connection().execute(
+            "SELECT value FROM cache WHERE key = ? AND expires_at > ?", (key, time.time())).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, key, value):
+        conn = self.connection()
+        conn.execute("INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                     (key, json.dumps(value), time.time() + self.ttl))
+        self.writes += 1
+        if self.writes % self.PRUNE_EVERY == 0:
+            conn.execute("DELETE FROM cache WHERE expires_at <= ?", (time.time(),))
+            conn.execute("DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+                         (self.max_entries,))
+
+    def get_version(self, name):
+        row = self.connection().execute("SELECT version FROM versions WHERE name = ?", (name,)).fetchone()
+        return f"{self.epoch}.{row[0] if row else 0}"
+
+    def incr_version(self, name):
+        self.connection().execute(
+            "INSERT INTO versions (name, version) VALUES (?, 1) "
+            "ON CONFLICT(name) DO UPDATE SET version = version + 1", (name,))
+
+    def stats(self):
+        return {"entries": self.connection().execute("SELECT COUNT(*) FROM cache").fetchone()[0], "path": self.path}
+
+
+class RedisBackend:
+    """Cache shared through a Redis compatible server. Needs the `redis` package."""
+    name = "redis"
+    shared = True
+
+    def __init__(self, url, ttl=300):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.client.setnx("version:__epoch__", uuid.uuid4().hex[:8])
+        self.epoch = self.client.get("version:__epoch__").decode()
+
+    def get(self, key):
+        value = self.client.get(key)
+        return json.loads(value) if value is not None else None
+
+    def set(self, key, value):
+        self.client.set(key, json.dumps(value), ex=self.ttl)
+
+    def get_version(self, name):
+        return f"{self.epoch}.{int(self.client.get(f'version:{name}') or 0)}"
+
+    def incr_version(self, name):
+        self.client.incr(f"version:{name}")
+
+    def stats(self):
+        return {"entries": self.client.dbsize()}
+
+
+class Cache:
+    def __init__(self, backend):
+        self.backend = backend
+        self.lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def version(self, table):
+        return self.backend.get_version(table)
+
+    def bump(self, table):
+        self.backend.incr_version(table)
+
+    def key(self, model, id):
+        table = model.__tablename__
+        return f"{table}:{self.version(table)}:{id}"
+
+    def lookup(self, key):
+        value = self.backend.get(key)
+        with self.lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def get_serialized(self, model, id, fields=None):
+        """
+        serialize() of the row with this id, from the cache when possible. None if
+        it doesn't exist. With `fields` a hit is trimmed to them, and a miss only
+        SELECTs those columns (and is not cached).
+        """
+        key = self.key(model, id)
+        value = self.lookup(key)
+        if value is not None:
+            return value if fields is None else {field: value[field] for field in fields}
+        if fields is not None:
+            return get_projected(model, id, fields)
+
+        # Filled from the primary: a lagging replica would cache a stale row
+        # under the current version
+        row = db.session.get(model, id, bind_arguments={"bind": db.engine})
+        if row is None:
+            return None
+        value = row.serialize()
+        self.backend.set(key, value)
+        return value
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            stats = {
+                "backend": self.backend.name,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+                "ttl": self.backend.ttl,
+            }
+        stats.update(self.backend.stats())
+        return stats
+
+
+cache = Cache(MemoryBackend())
+
+
+def get_serialized(model, id, fields=None):
+    return cache.get_serialized(model, id, fields)
+
+
+# Versions are bumped on commit for every table the session wrote to, through
+# the ORM (flush) or with insert/update/delete statements, so the handlers, the
+# bulk endpoints and the admin views all invalidate without calling the cache.
+
+def changed_tables(session):
+    return session.info.setdefault("cache_changed", set())
+
+
+@event.listens_for(Session, "after_flush")
+def collect_flushed(session, flush_context):
+    changed = changed_tables(session)
+    for row in list(session.new) + list(session.dirty) + list(session.deleted):
+        if hasattr(row, "__tablename__"):
+            changed.add(row.__tablename__)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def collect_statements(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        changed_tables(orm_execute_state.session).add(orm_execute_state.statement.table.name)
+
+
+@event.listens_for(Session, "after_commit")
+def bump_versions(session):
+    for table in session.info.pop("cache_changed", ()):
+        cache.bump(table)
+
+
+@event.listens_for(Session, "after_rollback")
+def discard_changes(session):
+    session.info.pop("cache_changed", None)
+
+
+def setup_cache(app):
+    backend = app.config["CACHE_BACKEND"]
+    if backend == "memory":
+        cache.backend = MemoryBackend(app.config["CACHE_MAX_ENTRIES"], app.config["CACHE_TTL"])
+    elif backend == "sqlite":
+        cache.backend = SQLiteBackend(app.config["CACHE_SQLITE_PATH"], app.config["CACHE_MAX_ENTRIES"], app.config["CACHE_TTL"])
+    elif backend == "redis":
+        cache.backend = RedisBackend(app.config["CACHE_REDIS_URL"], app.config["CACHE_TTL"])
+    else:
+        raise ValueError(f"Unknown CACHE_BACKEND {backend}, use memory, sqlite or redis")
+
+    @app.route('/cache/stats', methods=['GET'])
+    def cache_stats():
+        return jsonify({"msg": "Ok", "response": cache.stats()}), 200
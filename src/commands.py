@@ -0,0 +1,362 @@
+"""
+Flask CLI commands of the catalog:
+
+    flask catalog generate --people 1000000 --vehicles 1000000 --planets 1000000 --users 10000
+    flask catalog export people people.csv
+    flask catalog import people people.csv
+
+`generate` fills the tables with synthetic rows. The rows are deterministic
+for a given --seed, and valid for the models: unique names, user names and
+emails, strings within the column lengths, favourites pointing at existing
+rows and unique per user. Rows are built lazily and loaded in batches of
+--batch-size, with COPY on Postgres (psycopg2) and the driver's executemany elsewhere,
+so memory stays flat whatever the row count. Progress goes to stderr.
+
+`export` writes people, vehicles or planets as CSV, JSON lines or Parquet
+(when pyarrow is installed), reading them `--batch-size` rows at a time
+(a server-side cursor on Postgres). `import` reads such a file back in
+batches, validates the rows like the POST endpoints and upserts them on
+`name`, one transaction per batch. Ids are exported but not imported: the
+rows keep or get the ids of the target database.
+"""
+import csv
+import io
+import os
+import random
+import sys
+import time
+from array import array
+from itertools import islice
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import insert, select, func
+from models import db, Users, People, Vehicles, Planets, FAVOURITE_KINDS, upsert, insert_ignore
+from validation import SCHEMAS
+from cache import cache
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+catalog = AppGroup("catalog", help="Generate, import and export catalog data.")
+
+COLLECTIONS = {"people": People, "vehicles": Vehicles, "planets": Planets}
+EXTENSIONS = {".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl", ".parquet": "parquet"}
+FORMATS = ("csv", "jsonl", "parquet") if pyarrow else ("csv", "jsonl")
+
+SYLLABLES = ["an", "ar", "ba", "da", "do", "ga", "ja", "ka", "ke", "lu", "ma", "mo", "na", "ob",
+             "pa", "ra", "sa", "sky", "ta", "th", "va", "wa", "wo", "yo", "ze"]
+GENDERS = ["male", "female", "n/a", "none"]
+COLORS = ["blue", "brown", "black", "blond", "red", "green", "yellow", "white", "grey", "orange"]
+CLASSES = ["wheeled", "repulsorcraft", "starfighter", "walker", "speeder", "airspeeder", "submarine"]
+MANUFACTURERS = ["Incom Corporation", "Kuat Drive Yards", "Sienar Fleet Systems", "Corellia Mining Corporation",
+                 "Aratech Repulsor Company", "Koro-Kessel", "SoroSuub Corporation"]
+CLIMATES = ["arid", "temperate", "tropical", "frozen", "murky", "windy", "hot", "humid"]
+TERRAINS = ["desert", "grasslands", "mountains", "jungle", "tundra", "ocean", "swamp", "cityscape"]
+
+
+def word(rng, syllables=3):
+    return "".join(rng.choice(SYLLABLES) for i in range(rng.randrange(2, syllables + 1))).capitalize()
+
+
+# One row of each model. `name` is given by the caller, who keeps it unique.
+
+def fake_person(rng, name):
+    return {"name": name, "gender": rng.choice(GENDERS), "birth_year": f"{rng.randrange(1000)}BBY",
+            "eye_color": rng.choice(COLORS), "hair_color": rng.choice(COLORS),
+            "mass": rng.randrange(20, 200), "height": rng.randrange(60, 260)}
+
+
+def fake_vehicle(rng, name):
+    return {"name": name, "model": f"{word(rng)}-{rng.randrange(1, 100)}", "vehicle_class": rng.choice(CLASSES),
+            "manufacturer": rng.choice(MANUFACTURERS), "cost_in_credits": rng.randrange(1000, 10000000),
+            "length": rng.randrange(1, 500), "crew": rng.randrange(1, 50), "passengers": rng.randrange(0, 500),
+            "max_atmosphering_speed": rng.randrange(100, 2000), "cargo_capacity": rng.randrange(0, 1000000),
+            "consumables": f"{rng.randrange(1, 12)} months"}
+
+
+def fake_planet(rng, name):
+    return {"name": name, "diameter": rng.randrange(1000, 200000), "rotation_period": rng.randrange(10, 60),
+            "orbital_period": rng.randrange(100, 1000), "gravity": f"{rng.randrange(1, 4)} standard",
+            "population": rng.randrange(0, 2000000000), "climate": rng.choice(CLIMATES),
+            "surface_water": rng.randrange(0, 100), "terrain": rng.choice(TERRAINS)}
+
+
+def fake_user(rng, number):
+    return {"user_name": f"user{number}", "first_name": word(rng), "last_name": word(rng, 4),
+            "email": f"user{number}@example.com", "password": f"{rng.getrandbits(64):016x}"}
+
+
+FAKES = {People: (fake_person, "Person"), Vehicles: (fake_vehicle, "Vehicle"), Planets: (fake_planet, "Planet")}
+
+
+def favourite_counts(users, max_favourites):
+    """Favourites of each of `users` users: most have a handful, the last ones up to `max_favourites`."""
+    return [int(max_favourites * (i / max(users - 1, 1)) ** 3) for i in range(users)]
+
+
+def batches(rows, size):
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+def copy_rows(conn, table, columns, batch):
+    """COPY a batch into `table` through psycopg2, one CSV buffer per batch."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerows([row[column] for column in columns] for row in batch)
+    buffer.seek(0)
+    cursor = conn.connection.dbapi_connection.cursor()
+    cursor.copy_expert(f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+    cursor.close()
+
+
+def execute_many(conn, table, columns, batch):
+    """executemany straight on the DBAPI cursor, Core's per row parameter processing halves the speed."""
+    compiled = insert(table).compile(dialect=conn.dialect, column_keys=columns)
+    if compiled.positional:
+        batch = [tuple(row[column] for column in compiled.positiontup) for row in batch]
+    cursor = conn.connection.dbapi_connection.cursor()
+    cursor.executemany(str(compiled), batch)
+    cursor.close()
+
+
+def progress(name, total, started, extra=""):
+    click.echo(f"\r{name}: {total} rows ({total / (time.perf_counter() - started):.0f}/s){extra}", nl=False, err=True)
+
+
+def load(conn, model, rows, batch_size):
+    """Insert the `rows` dicts in batches, returns how many were inserted."""
+    table = model.__table__
+    use_copy = conn.dialect.name == "postgresql" and conn.dialect.driver == "psycopg2"
+    total = 0
+    started = time.perf_counter()
+    for batch in batches(rows, batch_size):
+        load_batch = copy_rows if use_copy else execute_many
+        load_batch(conn, table, list(batch[0]), batch)
+        total += len(batch)
+        progress(table.name, total, started)
+    if total:
+        click.echo(err=True)
+    return total
+
+
+def ids_after(conn, model, last_id):
+    """The ids above `last_id`, as a compact array."""
+    return array("q", conn.execute(select(model.id).where(model.id > last_id).order_by(model.id)).scalars())
+
+
+def generate_catalog(engine, people=0, vehicles=0, planets=0, users=0, max_favourites=0, seed=42, batch_size=10000):
+    """
+    Add synthetic rows to the catalog. Names continue after the highest id of
+    each table, so running it again appends instead of colliding. Only the
+    users created by this run get favourites, pointing at rows of this run.
+    The cache versions of the tables written to are bumped after the commit.
+    """
+    rng = random.Random(seed)
+    counts = {People: people, Vehicles: vehicles, Planets: planets}
+    new_ids = {}
+    changed = set()
+
+    with engine.begin() as conn:
+        for model, count in counts.items():
+            last_id = conn.execute(select(func.coalesce(func.max(model.id), 0))).scalar()
+            fake, label = FAKES[model]
+            if load(conn, model, (fake(rng, f"{word(rng)} {label} {last_id + i + 1}") for i in range(count)), batch_size):
+                changed.add(model.__tablename__)
+            new_ids[model] = ids_after(conn, model, last_id)
+
+        last_user = conn.execute(select(func.coalesce(func.max(Users.id), 0))).scalar()
+        if load(conn, Users, (fake_user(rng, last_user + i + 1) for i in range(users)), batch_size):
+            changed.add(Users.__tablename__)
+        user_ids = ids_after(conn, Users, last_user)
+
+        per_user = favourite_counts(len(user_ids), max_favourites)
+        for kind, (model, favourite_model, column) in FAVOURITE_KINDS.items():
+            targets = new_ids[model]
+            if not targets:
+                continue
+
+            def favourites():
+                for user_id, total in zip(user_ids, per_user):
+                    # Split between the three kinds
+                    for index in rng.sample(range(len(targets)), min(total // 3, len(targets))):
+                        yield {"user_id": user_id, column: targets[index]}
+
+            if load(conn, favourite_model, favourites(), batch_size):
+                changed.add(favourite_model.__tablename__)
+
+    # The rows didn't go through the session, whose commit hooks bump the
+    # versions: bump them here, or the list ETags would keep matching
+    for table in changed:
+        cache.bump(table)
+
+
+@catalog.command("generate")
+@click.option("--people", default=0, help="People to add.")
+@click.option("--vehicles", default=0, help="Vehicles to add.")
+@click.option("--planets", default=0, help="Planets to add.")
+@click.option("--users", default=0, help="Users to add.")
+@click.option("--max-favourites", default=0, help="Favourites of the heaviest new user, the others get fewer.")
+@click.option("--seed", default=42, help="Random seed, the same seed gives the same rows.")
+@click.option("--batch-size", default=10000, help="Rows per INSERT/COPY.")
+def generate_command(people, vehicles, planets, users, max_favourites, seed, batch_size):
+    """Add synthetic people, vehicles, planets, users and favourites."""
+    started = time.perf_counter()
+    generate_catalog(db.engine, people, vehicles, planets, users, max_favourites, seed, batch_size)
+    click.echo(f"Done in {time.perf_counter() - started:.1f}s")
+
+
+def file_format(path, format):
+    if format:
+        return format
+    format = EXTENSIONS.get(os.path.splitext(path)[1].lower())
+    if format == "parquet" and not pyarrow:
+        raise click.UsageError("Parquet needs the pyarrow package")
+    if not format:
+        raise click.UsageError(f"Can't tell the format of {path}, use --format")
+    return format
+
+
+def open_text(path, mode):
+    if path == "-":
+        return click.open_file(path, mode)
+    return open(path, mode, newline="", encoding="utf-8")
+
+
+def arrow_schema(model):
+    return pyarrow.schema([(column.name, pyarrow.int64() if column.type.python_type is int else pyarrow.string())
+                           for column in model.__table__.columns])
+
+
+def write_rows(path, format, model, partitions):
+    """Write the batches of row tuples of `partitions` to `path` ("-" for stdout), yields the batch sizes."""
+    names = [column.name for column in model.__table__.columns]
+    if format == "parquet":
+        if path == "-":
+            raise click.UsageError("Parquet can't be written to stdout")
+        schema = arrow_schema(model)
+        with pyarrow.parquet.ParquetWriter(path, schema) as writer:
+            for rows in partitions:
+                writer.write_batch(pyarrow.record_batch([list(values) for values in zip(*rows)], schema=schema))
+                yield len(rows)
+        return
+
+    dumps = current_app.json.dumps
+    with open_text(path, "w") as file:
+        if format == "csv":
+            writer = csv.writer(file)
+            writer.writerow(names)
+        for rows in partitions:
+            if format == "csv":
+                writer.writerows(rows)
+            else:
+                file.write("".join(dumps(dict(zip(names, row))) + "\n" for row in rows))
+            yield len(rows)
+
+
+def read_rows(path, format, batch_size):
+    """The rows of `path` ("-" for stdin) as dicts, read `batch_size` at a time from Parquet files."""
+    if format == "parquet":
+        if path == "-":
+            raise click.UsageError("Parquet can't be read from stdin")
+        for batch in pyarrow.parquet.ParquetFile(path).iter_batches(batch_size):
+            yield from batch.to_pylist()
+        return
+
+    loads = current_app.json.loads
+    with open_text(path, "r") as file:
+        if format == "csv":
+            yield from csv.DictReader(file)
+        else:
+            for line in file:
+                if line.strip():
+                    yield loads(line)
+
+
+def csv_types(model):
+    """CSV values are all strings: convert the integer fields, and empty values of nullable fields to None."""
+    converters = []
+    for column in model.__table__.columns:
+        converters.append((column.name, column.type.python_type is int, column.nullable))
+
+    def convert(row):
+        for name, integer, nullable in converters:
+            value = row.get(name)
+            if value == "" and (nullable or integer):
+                row[name] = None
+            elif integer and value is not None and value.lstrip("-").isdigit():
+                row[name] = int(value)
+        return row
+
+    return convert
+
+
+@catalog.command("export")
+@click.argument("collection", type=click.Choice(list(COLLECTIONS)))
+@click.argument("path", default="-")
+@click.option("--format", "format", type=click.Choice(FORMATS), help="Defaults to the extension of PATH.")
+@click.option("--batch-size", default=10000, help="Rows fetched and written at a time.")
+def export_command(collection, path, format, batch_size):
+    """Export COLLECTION to PATH, stdout by default (as JSON lines)."""
+    model = COLLECTIONS[collection]
+    format = file_format(path, format or ("jsonl" if path == "-" else None))
+    query = select(*model.__table__.columns).order_by(model.id)
+    result = db.session.execute(query, execution_options={"yield_per": batch_size})
+
+    total = 0
+    started = time.perf_counter()
+    for count in write_rows(path, format, model, result.partitions()):
+        total += count
+        progress(collection, total, started)
+    click.echo(f"\n{collection}: exported {total} rows to {path}", err=True)
+
+
+@catalog.command("import")
+@click.argument("collection", type=click.Choice(list(COLLECTIONS)))
+@click.argument("path")
+@click.option("--format", "format", type=click.Choice(FORMATS), help="Defaults to the extension of PATH.")
+@click.option("--batch-size", default=5000, help="Rows per transaction.")
+@click.option("--skip-existing", is_flag=True, help="Keep the rows whose name exists instead of updating them.")
+def import_command(collection, path, format, batch_size, skip_existing):
+    """
+    Import COLLECTION from PATH ("-" for stdin, as JSON lines). Rows are
+    upserted on name, the invalid ones are reported and skipped.
+    """
+    model = COLLECTIONS[collection]
+    schema = SCHEMAS[model]
+    format = file_format(path, format or ("jsonl" if path == "-" else None))
+    convert = csv_types(model) if format == "csv" else None
+    rejected = []
+
+    def valid_rows():
+        for number, row in enumerate(read_rows(path, format, batch_size), start=1):
+            if convert:
+                row = convert(row)
+            errors = schema.validate(row)
+            if errors:
+                rejected.append(number)
+                click.echo(f"\n{collection}: row {number} skipped: {', '.join(errors)}", err=True)
+                continue
+            yield {name: row.get(name) for name in schema.names}
+
+    total = written = 0
+    started = time.perf_counter()
+    for batch in batches(valid_rows(), batch_size):
+        # The same name twice in one statement would make ON CONFLICT DO UPDATE fail, the last one wins
+        batch = list({row["name"]: row for row in batch}.values())
+        written += insert_ignore(model, batch) if skip_existing else upsert(model, batch)
+        db.session.commit()
+        total += len(batch)
+        progress(collection, total, started)
+    click.echo(f"\n{collection}: wrote {written} of {total} rows from {path}, {len(rejected)} invalid", err=True)
+    if rejected:
+        sys.exit(1)
+
+
+def setup_commands(app):
+    app.cli.add_command(catalog)
@@ -0,0 +1,105 @@
+"""
+Negotiated response compression: brotli (when the `brotli` package is
+installed) or gzip, chosen from Accept-Encoding in an after_request hook.
+
+Bodies under COMPRESSION_MIN_SIZE bytes are sent as they are, compressing them
+costs more than it saves. Streamed exports are compressed chunk by chunk, each
+chunk flushed so the client still receives the rows as they are read.
+"""
+import zlib
+from flask import request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# In order of preference when the client accepts several with the same quality
+ENCODINGS = ("br", "gzip") if brotli else ("gzip",)
+
+COMPRESSIBLE = ("application/json", "application/x-ndjson", "text/")
+
+
+class GzipCompressor:
+    def __init__(self, level):
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self.compressor.compress(data)
+
+    def flush(self):
+        return self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self.compressor.flush()
+
+
+class BrotliCompressor:
+    def __init__(self, quality):
+        self.compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data):
+        return self.compressor.process(data)
+
+    def flush(self):
+        return self.compressor.flush()
+
+    def finish(self):
+        return self.compressor.finish()
+
+
+def compressor(encoding, config):
+    if encoding == "br":
+        return BrotliCompressor(config["COMPRESSION_BROTLI_QUALITY"])
+    return GzipCompressor(config["COMPRESSION_GZIP_LEVEL"])
+
+
+def compress_stream(chunks, compressor):
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode()
+            data = compressor.compress(chunk) + compressor.flush()
+            if data:
+                yield data
+        yield compressor.finish()
+    finally:
+        if hasattr(chunks, "close"):
+            chunks.close()
+
+
+def setup_compression(app):
+    if not app.config["COMPRESSION_ENABLED"]:
+        return
+
+    @app.after_request
+    def compress_response(response):
+        if not response.mimetype.startswith(COMPRESSIBLE):
+            return response
+        response.vary.add("Accept-Encoding")
+
+        if (response.status_code < 200 or response.status_code in (204, 304)
+                or "Content-Encoding" in response.headers or response.direct_passthrough):
+            return response
+
+        encoding = request.accept_encodings.best_match(ENCODINGS)
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            response.response = compress_stream(response.response, compressor(encoding, app.config))
+            response.headers.pop("Content-Length", None)
+        else:
+            data = response.get_data()
+            if len(data) < app.config["COMPRESSION_MIN_SIZE"]:
+                return response
+            compressing = compressor(encoding, app.config)
+            response.set_data(compressing.compress(data) + compressing.finish())
+
+        response.headers["Content-Encoding"] = encoding
+        # A compressed body is another representation: give it its own strong
+        # ETag, etagged() strips the suffix back when matching If-None-Match
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(f"{etag}-{encoding}")
+        return response
@@ -0,0 +1,74 @@
+"""
+Strong ETags computed from the per-table versions kept by the cache, so a
+matching If-None-Match is answered with a 304 before the view runs: no rows are
+read and nothing is serialized.
+
+Only with a shared cache backend (sqlite, redis). The memory backend keeps
+versions per process and without a TTL: a worker that didn't handle a write
+would answer 304 for stale data until it handles one itself.
+
+Nor for requests reading from a replica: the versions are bumped when the
+primary commits, a lagging replica would serve the old rows under the new tag,
+and they would then be confirmed with 304s after the replica caught up.
+"""
+import hashlib
+from functools import wraps
+from flask import request, make_response
+from cache import cache
+from models import db
+from compression import ENCODINGS
+
+
+def compute_etag(tables):
+    parts = [request.full_path, request.headers.get("Accept", ""), request.headers.get("Accept-Version", "")]
+    parts += [f"{table}={cache.version(table)}" for table in tables]
+    return hashlib.sha1("|".join(parts).encode()).hexdigest()
+
+
+def request_etag(tables):
+    """The ETag of the current request, None when the versions can't be trusted to change with the data."""
+    if not cache.backend.shared or db.session().replica() is not None:
+        return None
+    return compute_etag(tables)
+
+
+def not_modified(etag):
+    """A 304 response when If-None-Match has `etag`, None otherwise."""
+    # The compressed responses carry the tag with an -gzip/-br suffix
+    for tag in [etag] + [f"{etag}-{encoding}" for encoding in ENCODINGS]:
+        if request.if_none_match.contains_weak(tag):
+            response = make_response("", 304)
+            response.set_etag(tag)
+            return response
+    return None
+
+
+def etagged(*tables, vary=()):
+    """
+    Tag the 200 responses of the view with an ETag that changes whenever one
+    of `tables` is written to, and answer 304 when the client already has it.
+    `vary` names the request headers that change the response (and so are
+    part of the ETag), sent on every response, 304s included.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            response = tagged(view, args, kwargs)
+            for header in vary:
+                response.vary.add(header)
+            return response
+
+        def tagged(view, args, kwargs):
+            etag = request_etag(tables)
+            if etag is None:
+                return make_response(view(*args, **kwargs))
+            response = not_modified(etag)
+            if response is not None:
+                return response
+
+            response = make_response(view(*args, **kwargs))
+            if response.status_code == 200 and not response.is_streamed:
+                response.set_etag(etag)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,43 @@
+"""
+Compact shape of /users/favorites/<id>, asked for with ?format=compact or an
+`Accept-Version: 2` header:
+
+    {"user": {...},
+     "favourites": {"people": [1, 4], "vehicle": [7], "planet": []},
+     "included": {"people": {"1": {...}, "4": {...}}, "vehicle": {"7": {...}}, "planet": {}}}
+
+The user is sent once instead of inside every entry, and the favourited rows
+are selected as plain columns (no ORM objects), one query per kind.
+"""
+from flask import request
+from models import FAVOURITE_KINDS
+from serialization import select_columns, to_dicts
+from utils import APIException
+
+FORMATS = ("full", "compact")
+
+
+def wants_compact():
+    shape = request.args.get("format")
+    if shape is None:
+        return request.headers.get("Accept-Version") == "2"
+    if not shape in FORMATS:
+        raise APIException(f"Unknown format {shape}, use full or compact", status_code=400)
+    return shape == "compact"
+
+
+def compact_favourites(user_info):
+    """The compact favourites of the user serialized as `user_info`, None when there are none."""
+    favourites = {}
+    included = {}
+    for kind, (model, favourite_model, column) in FAVOURITE_KINDS.items():
+        rows = to_dicts(select_columns(model)
+                        .join(favourite_model, getattr(favourite_model, column) == model.id)
+                        .filter(favourite_model.user_id == user_info["id"])
+                        .order_by(favourite_model.id).all())
+        favourites[kind] = [row["id"] for row in rows]
+        included[kind] = {row["id"]: row for row in rows}
+
+    if not any(favourites.values()):
+        return None
+    return {"user": user_info, "favourites": favourites, "included": included}
@@ -0,0 +1,73 @@
+"""
+Query string filters and sorting for the catalog collections.
+
+    /planets?climate=arid&population__gte=1000000&sort=-population
+
+Only columns with a (column, id) index can be filtered or sorted on, so every
+filter is an index range and pages keep ordering by (column, id) with keyset
+cursors.
+"""
+from flask import request
+from models import People, Vehicles, Planets
+from utils import APIException
+
+FILTERABLE = {
+    People: ["gender", "eye_color", "hair_color", "mass", "height"],
+    Vehicles: ["vehicle_class", "manufacturer", "cost_in_credits", "crew", "passengers", "cargo_capacity"],
+    Planets: ["climate", "terrain", "population", "diameter"],
+}
+
+SORTABLE = {model: ["id", "name"] + names for model, names in FILTERABLE.items()}
+
+OPERATORS = {
+    "gt": lambda column, value: column > value,
+    "gte": lambda column, value: column >= value,
+    "lt": lambda column, value: column < value,
+    "lte": lambda column, value: column <= value,
+}
+
+# Query string parameters that are not filters
+RESERVED = {"limit", "cursor", "fields", "stream", "sort"}
+
+
+def apply_filters(query, model):
+    for param, raw in request.args.items():
+        if param in RESERVED:
+            continue
+
+        name, _, operator = param.partition("__")
+        if not name in FILTERABLE.get(model, ()):
+            raise APIException(f"Can't filter by {param}", status_code=400)
+
+        column = model.__table__.c[name]
+        label = name.replace("_", " ").capitalize()
+        if column.type.python_type == int:
+            try:
+                value = int(raw)
+            except ValueError:
+                raise APIException(f"{label} must be an integer", status_code=400)
+        elif operator:
+            raise APIException(f"{label} only supports equality filters", status_code=400)
+        else:
+            value = raw
+
+        if not operator:
+            query = query.filter(column == value)
+        elif operator in OPERATORS:
+            query = query.filter(OPERATORS[operator](column, value))
+        else:
+            raise APIException(f"Unknown operator {operator}, use gt, gte, lt or lte", status_code=400)
+    return query
+
+
+def requested_sort(model):
+    """(column, descending) from ?sort=column or ?sort=-column, None for the default id order."""
+    sort = request.args.get("sort")
+    if not sort:
+        return None
+
+    descending = sort.startswith("-")
+    name = sort.lstrip("-")
+    if not name in SORTABLE.get(model, ()):
+        raise APIException(f"Can't sort by {name}", status_code=400)
+    return model.__table__.c[name], descending
@@ -0,0 +1,167 @@
+"""
+Opt-in per request instrumentation (METRICS_ENABLED=1).
+
+For every request it counts the SQL statements and their time (engine
+events), the time spent encoding JSON and the response size. They are sent
+back in a Server-Timing header:
+
+    Server-Timing: db;dur=3.1;desc="queries: 4", serialize;dur=0.8, total;dur=6.2
+
+and aggregated per endpoint in Prometheus histograms served by GET /metrics.
+The numbers are per process: with several workers each one reports its own.
+"""
+import time
+from threading import Lock
+from flask import request, g, has_app_context, Response
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(names, values):
+    return ",".join(f'{name}="{escape(value)}"' for name, value in zip(names, values))
+
+
+class Counter:
+    def __init__(self, name, help, labels):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.values = {}
+        self.lock = Lock()
+
+    def inc(self, labels, amount=1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            for labels, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{{{format_labels(self.labels, labels)}}} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labels, buckets):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        # labels -> [count per bucket (not cumulative)..., count above the last bucket, sum]
+        self.values = {}
+        self.lock = Lock()
+
+    def observe(self, labels, value):
+        with self.lock:
+            series = self.values.setdefault(labels, [0] * (len(self.buckets) + 1) + [0])
+            index = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+            series[index] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            for labels, series in sorted(self.values.items()):
+                label_text = format_labels(self.labels, labels)
+                cumulative = 0
+                for bound, count in zip(self.buckets + ("+Inf",), series):
+                    cumulative += count
+                    lines.append(f'{self.name}_bucket{{{label_text},le="{bound}"}} {cumulative}')
+                lines.append(f"{self.name}_sum{{{label_text}}} {round(series[-1], 6)}")
+                lines.append(f"{self.name}_count{{{label_text}}} {cumulative}")
+        return lines
+
+
+requests_total = Counter("http_requests_total", "Requests answered.", ("method", "endpoint", "status"))
+request_duration = Histogram("http_request_duration_seconds", "Time to build the response.",
+                             ("method", "endpoint"), DURATION_BUCKETS)
+response_size = Histogram("http_response_size_bytes", "Response body size, after compression.",
+                          ("method", "endpoint"), SIZE_BUCKETS)
+db_queries = Histogram("db_queries_per_request", "SQL statements run by a request.",
+                       ("method", "endpoint"), QUERY_BUCKETS)
+db_duration = Histogram("db_duration_seconds", "Time a request spent running SQL statements.",
+                        ("method", "endpoint"), DURATION_BUCKETS)
+serialize_duration = Histogram("serialize_duration_seconds", "Time a request spent encoding JSON.",
+                               ("method", "endpoint"), DURATION_BUCKETS)
+
+METRICS = (requests_total, request_duration, response_size, db_queries, db_duration, serialize_duration)
+
+
+def measuring():
+    return has_app_context() and "metrics_start" in g
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def start_query(conn, cursor, statement, parameters, context, executemany):
+    if measuring():
+        conn.info.setdefault("metrics_query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def end_query(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("metrics_query_start")
+    if starts and measuring():
+        g.metrics_db_time += time.perf_counter() - starts.pop()
+        g.metrics_db_queries += 1
+
+
+def setup_metrics(app):
+    """Instrument the app when METRICS_ENABLED. Call after setup_json and before setup_compression."""
+    if not app.config["METRICS_ENABLED"]:
+        return
+
+    # jsonify() goes through app.json.response: time it
+    json_response = app.json.response
+
+    def timed_response(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return json_response(*args, **kwargs)
+        finally:
+            if measuring():
+                g.metrics_serialize_time += time.perf_counter() - start
+
+    app.json.response = timed_response
+
+    @app.before_request
+    def start_request():
+        g.metrics_start = time.perf_counter()
+        g.metrics_db_queries = 0
+        g.metrics_db_time = 0.0
+        g.metrics_serialize_time = 0.0
+
+    # Registered before the compression hook, so it runs after it and sees the compressed size
+    @app.after_request
+    def record_request(response):
+        if not "metrics_start" in g:
+            return response
+        total = time.perf_counter() - g.metrics_start
+        labels = (request.method, request.url_rule.rule if request.url_rule else "<unmatched>")
+
+        requests_total.inc(labels + (str(response.status_code),))
+        request_duration.observe(labels, total)
+        db_queries.observe(labels, g.metrics_db_queries)
+        db_duration.observe(labels, g.metrics_db_time)
+        serialize_duration.observe(labels, g.metrics_serialize_time)
+        if not response.is_streamed:
+            response_size.observe(labels, response.calculate_content_length() or 0)
+
+        response.headers["Server-Timing"] = ", ".join([
+            f'db;dur={g.metrics_db_time * 1000:.2f};desc="queries: {g.metrics_db_queries}"',
+            f"serialize;dur={g.metrics_serialize_time * 1000:.2f}",
+            f"total;dur={total * 1000:.2f}",
+        ])
+        return response
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        lines = [line for metric in METRICS for line in metric.render()]
+        return Response("\n".join(lines) + "\n", mimetype="text/plain; version=0.0.4")
@@ -1,8 +1,12 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import insert, update
+from sqlalchemy.dialects import postgresql, sqlite, mysql
+from sqlalchemy.exc import IntegrityError
+from replicas import RoutingSession
 
 # from eralchemy2 import render_er
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 
 
 class Users(db.Model):
@@ -39,6 +43,14 @@ class Users(db.Model):
 
 class People(db.Model):
     __tablename__ = "people"
+    # (column, id) indexes behind the collection filters and sorting, see filters.py
+    __table_args__ = (
+        db.Index("ix_people_gender_id", "gender", "id"),
+        db.Index("ix_people_eye_color_id", "eye_color", "id"),
+        db.Index("ix_people_hair_color_id", "hair_color", "id"),
+        db.Index("ix_people_mass_id", "mass", "id"),
+        db.Index("ix_people_height_id", "height", "id"),
+    )
     id = db.Column(db.Integer, primary_key=True)
 
     name = db.Column(db.String(50), unique=True, nullable=False)
@@ -71,6 +83,15 @@ class People(db.Model):
 
 class Vehicles(db.Model):
     __tablename__ = "vehicles"
+    # (column, id) indexes behind the collection filters and sorting, see filters.py
+    __table_args__ = (
+        db.Index("ix_vehicles_vehicle_class_id", "vehicle_class", "id"),
+        db.Index("ix_vehicles_manufacturer_id", "manufacturer", "id"),
+        db.Index("ix_vehicles_cost_in_credits_id", "cost_in_credits", "id"),
+        db.Index("ix_vehicles_crew_id", "crew", "id"),
+        db.Index("ix_vehicles_passengers_id", "passengers", "id"),
+        db.Index("ix_vehicles_cargo_capacity_id", "cargo_capacity", "id"),
+    )
     id = db.Column(db.Integer, primary_key=True)
 
     name = db.Column(db.String(50), unique=True, nullable=False)
@@ -111,6 +132,13 @@ class Vehicles(db.Model):
 
 class Planets(db.Model):
     __tablename__ = "planets"
+    # (column, id) indexes behind the collection filters and sorting, see filters.py
+    __table_args__ = (
+        db.Index("ix_planets_climate_id", "climate", "id"),
+        db.Index("ix_planets_terrain_id", "terrain", "id"),
+        db.Index("ix_planets_population_id", "population", "id"),
+        db.Index("ix_planets_diameter_id", "diameter", "id"),
+    )
     id = db.Column(db.Integer, primary_key=True)
 
     name = db.Column(db.String(50), unique=True, nullable=False)
@@ -150,65 +178,145 @@ class Planets(db.Model):
 
 class Favourites_people(db.Model):
     __tablename__ = "favourites_people"
+    __table_args__ = (
+        db.Index("ix_favourites_people_user_id_person_id", "user_id", "person_id", unique=True),
+    )
     id = db.Column(db.Integer, primary_key=True)
 
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
-    person_id = db.Column(db.Integer, db.ForeignKey("people.id"), nullable=False)
+    person_id = db.Column(db.Integer, db.ForeignKey("people.id"), nullable=False, index=True)
 
     def __repr__(self):
         return "<Favourites_people %r>" % self.id
 
-    def serialize(self):
-        person = People.query.filter_by(id=self.person_id).first()
-        user = Users.query.filter_by(id=self.user_id).first()
+    def serialize(self, user_info=None):
+        # Use the relationships so a joinedload on the query avoids
+        # one extra SELECT per row; callers listing one user's
+        # favourites pass the already serialized user in.
+        if user_info is None:
+            user_info = self.users.serialize()
 
         return {
             "id": self.id,
-            "user_info": user.serialize(),
-            "person_info": person.serialize(),
+            "user_info": user_info,
+            "person_info": self.people.serialize(),
         }
 
 
 class Favourites_vehicles(db.Model):
     __tablename__ = "favourites_vehicles"
+    __table_args__ = (
+        db.Index("ix_favourites_vehicles_user_id_vehicles_id", "user_id", "vehicles_id", unique=True),
+    )
     id = db.Column(db.Integer, primary_key=True)
 
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
-    vehicles_id = db.Column(db.Integer, db.ForeignKey("vehicles.id"), nullable=False)
+    vehicles_id = db.Column(db.Integer, db.ForeignKey("vehicles.id"), nullable=False, index=True)
 
     def __repr__(self):
         return "<Favourites_vehicles %r>" % self.id
 
-    def serialize(self):
-        vehicle = Vehicles.query.filter_by(id=self.vehicles_id).first()
-        user = Users.query.filter_by(id=self.user_id).first()
+    def serialize(self, user_info=None):
+        if user_info is None:
+            user_info = self.users.serialize()
 
         return {
             "id": self.id,
-            "user_info": user.serialize(),
-            "vehicle_info": vehicle.serialize(),
+            "user_info": user_info,
+            "vehicle_info": self.vehicles.serialize(),
         }
 
 
 class Favourites_planets(db.Model):
     __tablename__ = "favourites_planets"
+    __table_args__ = (
+        db.Index("ix_favourites_planets_user_id_planets_id", "user_id", "planets_id", unique=True),
+    )
     id = db.Column(db.Integer, primary_key=True)
 
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
-    planets_id = db.Column(db.Integer, db.ForeignKey("planets.id"), nullable=False)
+    planets_id = db.Column(db.Integer, db.ForeignKey("planets.id"), nullable=False, index=True)
 
     def __repr__(self):
         return "<Favourites_planets %r>" % self.id
 
-    def serialize(self):
-        planet = Planets.query.filter_by(id=self.planets_id).first()
-        user = Users.query.filter_by(id=self.user_id).first()
+    def serialize(self, user_info=None):
+        if user_info is None:
+            user_info = self.users.serialize()
 
         return {
             "id": self.id,
-            "user_info": user.serialize(),
-            "planet_info": planet.serialize(),
+            "user_info": user_info,
+            "planet_info": self.planets.serialize(),
         }
 
 
+# kind used by the /favorite/<kind>/... routes -> (target model, favourites model, target column)
+FAVOURITE_KINDS = {
+    "people": (People, Favourites_people, "person_id"),
+    "vehicle": (Vehicles, Favourites_vehicles, "vehicles_id"),
+    "planet": (Planets, Favourites_planets, "planets_id"),
+}
+
+
+def insert_ignore(model, rows):
+    """
+    INSERT ... ON CONFLICT DO NOTHING for Postgres and SQLite (INSERT IGNORE on
+    MySQL), so unique indexes reject duplicates without a SELECT first.
+    Returns the number of inserted rows.
+    """
+    table = model.__table__
+    dialect = db.session.get_bind().dialect.name
+
+    if dialect == "postgresql":
+        statement = postgresql.insert(table).on_conflict_do_nothing()
+    elif dialect == "sqlite":
+        statement = sqlite.insert(table).on_conflict_do_nothing()
+    elif dialect == "mysql":
+        statement = insert(table).prefix_with("IGNORE")
+    else:
+        inserted = 0
+        for row in rows:
+            try:
+                with db.session.begin_nested():
+                    db.session.execute(insert(table), row)
+                inserted += 1
+            except IntegrityError:
+                pass
+        return inserted
+
+    if len(rows) == 1:
+        return db.session.execute(statement, rows[0]).rowcount
+    return db.session.execute(statement, rows).rowcount
+
+
+def upsert(model, rows, key="name"):
+    """
+    INSERT ... ON CONFLICT (key) DO UPDATE for Postgres and SQLite (ON
+    DUPLICATE KEY UPDATE on MySQL): new rows are inserted, the rows whose
+    unique `key` exists overwrite it. The rows must all have the same fields
+    and hold each key once.
+    """
+    table = model.__table__
+    dialect = db.session.get_bind().dialect.name
+    columns = [name for name in rows[0] if name != key]
+
+    if dialect in ("postgresql", "sqlite"):
+        statement = (postgresql if dialect == "postgresql" else sqlite).insert(table)
+        statement = statement.on_conflict_do_update(index_elements=[key],
+                                                    set_={name: statement.excluded[name] for name in columns})
+    elif dialect == "mysql":
+        statement = mysql.insert(table)
+        statement = statement.on_duplicate_key_update({name: statement.inserted[name] for name in columns})
+    else:
+        for row in rows:
+            values = {name: row[name] for name in columns}
+            if not db.session.execute(update(table).where(table.c[key] == row[key]).values(values)).rowcount:
+                db.session.execute(insert(table), row)
+        return len(rows)
+
+    db.session.execute(statement, rows)
+    return len(rows)
+
+
 # render_er(db.Model, 'diagram.png')
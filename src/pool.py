@@ -0,0 +1,123 @@
+"""
+Database connection pool settings and statistics.
+
+The engine options come from the DB_* settings (pool size, overflow, timeout,
+recycle, pre-ping, Postgres statement timeout). The pool is a QueuePool that
+also records how long checkouts waited, how often the pool was exhausted
+(every connection, overflow included, in use) and how many checkouts timed
+out. GET /pool/stats reports them for the worker answering it.
+"""
+import os
+import time
+from threading import Lock
+from flask import jsonify
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError
+from sqlalchemy.pool import QueuePool
+from models import db
+
+
+class PoolStats:
+    def __init__(self):
+        self.lock = Lock()
+        self.checkouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.exhausted = 0
+        self.timeouts = 0
+        self.connects = 0
+        self.invalidations = 0
+
+    def record_checkout(self, wait, exhausted, timed_out):
+        with self.lock:
+            self.checkouts += 1
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+            self.exhausted += exhausted
+            self.timeouts += timed_out
+
+    def count(self, name):
+        with self.lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def to_dict(self):
+        with self.lock:
+            return {
+                "checkouts": self.checkouts,
+                "wait_ms_total": round(self.wait_total * 1000, 3),
+                "wait_ms_avg": round(self.wait_total * 1000 / self.checkouts, 3) if self.checkouts else None,
+                "wait_ms_max": round(self.wait_max * 1000, 3),
+                "exhausted": self.exhausted,
+                "timeouts": self.timeouts,
+                "connects": self.connects,
+                "invalidations": self.invalidations,
+            }
+
+
+stats = PoolStats()
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records checkout wait times, exhaustion and timeouts in `stats`."""
+
+    def _do_get(self):
+        exhausted = self._max_overflow > -1 and self.checkedout() >= self.size() + self._max_overflow
+        start = time.perf_counter()
+        timed_out = False
+        try:
+            return super()._do_get()
+        except TimeoutError:
+            timed_out = True
+            raise
+        finally:
+            stats.record_checkout(time.perf_counter() - start, exhausted, timed_out)
+
+
+def engine_options(config):
+    url = config["SQLALCHEMY_DATABASE_URI"]
+    if url.startswith("sqlite") and (url == "sqlite://" or ":memory:" in url):
+        # In-memory SQLite keeps a single connection per thread, no pool to size
+        return {}
+
+    options = {
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": config["DB_POOL_SIZE"],
+        "max_overflow": config["DB_MAX_OVERFLOW"],
+        "pool_timeout": config["DB_POOL_TIMEOUT"],
+        "pool_recycle": config["DB_POOL_RECYCLE"],
+        "pool_pre_ping": config["DB_POOL_PRE_PING"],
+    }
+    if url.startswith("postgresql") and config["DB_STATEMENT_TIMEOUT"]:
+        options["connect_args"] = {"options": f"-c statement_timeout={config['DB_STATEMENT_TIMEOUT']}"}
+    return options
+
+
+def setup_pool(app):
+    """Set SQLALCHEMY_ENGINE_OPTIONS, to be called before db.init_app(app)."""
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(app.config)
+
+    @app.route('/pool/stats', methods=['GET'])
+    def pool_stats():
+        pool = db.engine.pool
+        response = {"pid": os.getpid(), "pool": type(pool).__name__}
+        if isinstance(pool, QueuePool):
+            response.update({
+                "size": pool.size(),
+                "max_overflow": pool._max_overflow,
+                "timeout": pool.timeout(),
+                "checked_in": pool.checkedin(),
+                "checked_out": pool.checkedout(),
+                "overflow": max(pool.overflow(), 0),
+            })
+        response.update(stats.to_dict())
+        return jsonify({"msg": "Ok", "response": response}), 200
+
+
+@event.listens_for(InstrumentedQueuePool, "connect")
+def count_connect(dbapi_connection, connection_record):
+    stats.count("connects")
+
+
+@event.listens_for(InstrumentedQueuePool, "invalidate")
+def count_invalidation(dbapi_connection, connection_record, exception):
+    stats.count("invalidations")
@@ -0,0 +1,91 @@
+"""
+Read replica routing. With DATABASE_READ_URL set (one URL or several separated
+by commas) the queries of GET/HEAD requests go to a replica, everything else
+to DATABASE_URL.
+
+A request sticks to one replica, picked round-robin or by the fewest checked
+out connections (REPLICA_STRATEGY). After a client writes (POST, PUT, PATCH,
+DELETE) it gets a cookie that sends its reads to the primary for
+REPLICA_STICKY_SECONDS, so it reads its own writes while the replicas catch up.
+"""
+import time
+from itertools import count
+from threading import Lock
+from flask import request, current_app, has_request_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy.sql.dml import UpdateBase
+
+STICKY_COOKIE = "read_primary_until"
+READ_METHODS = ("GET", "HEAD")
+WRITE_METHODS = ("POST", "PUT", "PATCH", "DELETE")
+
+turn = count()
+turn_lock = Lock()
+
+
+def replica_keys(app):
+    return [key for key in app.config.get("SQLALCHEMY_BINDS", {}) if key.startswith("replica_")]
+
+
+def reads_from_primary():
+    if not has_request_context() or not request.method in READ_METHODS:
+        return True
+    try:
+        return float(request.cookies.get(STICKY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+def checked_out(engine):
+    pool = getattr(engine, "sync_engine", engine).pool
+    return pool.checkedout() if hasattr(pool, "checkedout") else 0
+
+
+def pick_replica(engines, keys, strategy):
+    """Bind key of the replica to use, `engines` maps the keys to (sync or async) engines."""
+    if strategy == "least_connections":
+        return min(keys, key=lambda key: checked_out(engines[key]))
+    with turn_lock:
+        return keys[next(turn) % len(keys)]
+
+
+class RoutingSession(Session):
+    """Session sending the reads of GET/HEAD requests to a replica engine, and the rest to the primary."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and not isinstance(clause, UpdateBase):
+            replica = self.replica()
+            if replica is not None:
+                return self._db.engines[replica]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def replica(self):
+        """The bind key of the replica of this session, None when it must use the primary."""
+        if not "replica" in self.info:
+            keys = replica_keys(current_app) if has_request_context() else []
+            if not keys or reads_from_primary():
+                self.info["replica"] = None
+            else:
+                self.info["replica"] = pick_replica(self._db.engines, keys, current_app.config["REPLICA_STRATEGY"])
+        return self.info["replica"]
+
+
+def setup_replicas(app):
+    """Register the DATABASE_READ_URL binds, to be called before db.init_app(app)."""
+    urls = [url.strip().replace("postgres://", "postgresql://")
+            for url in app.config["DATABASE_READ_URL"].split(",") if url.strip()]
+    if not urls:
+        return
+    if not app.config["REPLICA_STRATEGY"] in ("round_robin", "least_connections"):
+        raise ValueError(f"Unknown REPLICA_STRATEGY {app.config['REPLICA_STRATEGY']}, use round_robin or least_connections")
+
+    binds = app.config.setdefault("SQLALCHEMY_BINDS", {})
+    for index, url in enumerate(urls):
+        binds[f"replica_{index}"] = url
+
+    @app.after_request
+    def stick_to_primary(response):
+        if request.method in WRITE_METHODS and response.status_code < 400:
+            sticky = app.config["REPLICA_STICKY_SECONDS"]
+            response.set_cookie(STICKY_COOKIE, str(time.time() + sticky), max_age=sticky, httponly=True, samesite="Lax")
+        return response
@@ -0,0 +1,112 @@
+"""
+Name search across people, vehicles (name, model, manufacturer) and planets.
+
+Matching is case insensitive substring. Results are ranked exact name match,
+then name prefix, then name substring, then model/manufacturer matches, and
+shorter names first inside each group.
+
+On Postgres the LIKE '%q%' predicates are served by the pg_trgm GIN indexes of
+migration 9d3f6a1b7c20. On SQLite the same migration builds `catalog_search`, a
+trigram FTS5 table kept in sync by triggers. Without them (a database made with
+db.create_all(), another backend) the same query runs as a scan.
+"""
+from flask import request, jsonify
+from sqlalchemy import select, literal, case, or_, func, union_all, text, Table, MetaData, Column
+from models import db, People, Vehicles, Planets
+from utils import APIException, page_limit, encode_cursor, decode_cursor
+
+# kind -> (model, searched columns, the first one being the name)
+SOURCES = {
+    "people": (People, ["name"]),
+    "vehicle": (Vehicles, ["name", "model", "manufacturer"]),
+    "planet": (Planets, ["name"]),
+}
+
+FTS_TABLE = "catalog_search"
+
+# Not on db.metadata: only the migration creates it
+search_table = Table(FTS_TABLE, MetaData(), Column("kind"), Column("ref_id"),
+                     Column("name"), Column("model"), Column("manufacturer"))
+
+fts_available = {}
+
+
+def escape_like(value):
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def has_fts():
+    engine = db.engine
+    if engine.url not in fts_available:
+        found = engine.dialect.name == "sqlite" and db.session.execute(
+            text("SELECT 1 FROM sqlite_master WHERE name = :name"), {"name": FTS_TABLE}).first() is not None
+        fts_available[engine.url] = found
+    return fts_available[engine.url]
+
+
+def rank(name, q):
+    return case(
+        (func.lower(name) == q, 0),
+        (func.lower(name).like(escape_like(q) + "%", escape="\\"), 1),
+        (func.lower(name).like("%" + escape_like(q) + "%", escape="\\"), 2),
+        else_=3,
+    )
+
+
+def like_query(q, kinds):
+    pattern = "%" + escape_like(q) + "%"
+    selects = []
+    for kind in kinds:
+        model, fields = SOURCES[kind]
+        matches = [func.lower(getattr(model, field)).like(pattern, escape="\\") for field in fields]
+        selects.append(select(
+            literal(kind).label("kind"), model.id.label("id"), model.name.label("name"),
+            rank(model.name, q).label("rank"),
+        ).where(or_(*matches)))
+    return union_all(*selects).subquery()
+
+
+def fts_query(q, kinds):
+    table = search_table
+    match = '"' + q.replace('"', '""') + '"'
+    return select(
+        table.c.kind, table.c.ref_id.label("id"), table.c.name, rank(table.c.name, q).label("rank"),
+    ).where(text(f"{FTS_TABLE} MATCH :match").bindparams(match=match), table.c.kind.in_(kinds)).subquery()
+
+
+def search():
+    response_body = {}
+
+    q = request.args.get("q", "").strip().lower()
+    if not q:
+        raise APIException("Query parameter q is required", status_code=400)
+
+    kinds = list(SOURCES)
+    if request.args.get("kind"):
+        kinds = request.args.get("kind").split(",")
+        unknown = [kind for kind in kinds if not kind in SOURCES]
+        if unknown:
+            raise APIException(f"Unknown kind {', '.join(unknown)}, use people, vehicle or planet", status_code=400)
+
+    limit = page_limit()
+    offset = 0
+    if request.args.get("cursor"):
+        offset = decode_cursor(request.args.get("cursor"))[0]
+        if type(offset) != int or offset < 0:
+            raise APIException("Invalid cursor", status_code=400)
+
+    # A trigram MATCH needs 3 characters, shorter queries get the LIKE scan
+    results = fts_query(q, kinds) if len(q) >= 3 and has_fts() else like_query(q, kinds)
+    rows = db.session.execute(
+        select(results).order_by(results.c.rank, func.length(results.c.name), results.c.kind, results.c.id)
+        .limit(limit + 1).offset(offset)).all()
+
+    if not rows:
+        return jsonify(response_body), 204  # No content
+
+    response_body["msg"] = "Ok"
+    response_body["response"] = [
+        {"kind": row.kind, "id": row.id, "name": row.name, "match": ["exact", "prefix", "name", "other"][row.rank]}
+        for row in rows[:limit]]
+    response_body["next"] = encode_cursor([offset + limit]) if len(rows) > limit else None
+    return jsonify(response_body), 200
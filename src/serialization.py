@@ -0,0 +1,82 @@
+"""
+Fast paths for building JSON responses: an orjson backed JSON provider when
+orjson is installed, and column projections that build the serialized rows
+straight from SELECTed tuples instead of hydrating ORM objects.
+"""
+from flask import request
+from flask.json.provider import DefaultJSONProvider
+from utils import APIException
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class ORJSONProvider(DefaultJSONProvider):
+    options = orjson.OPT_NON_STR_KEYS if orjson else 0
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=self.options).decode()
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        data = orjson.dumps(obj, default=self.default, option=self.options)
+        return self._app.response_class(data + b"\n", mimetype=self.mimetype)
+
+
+def setup_json(app):
+    if orjson is not None and app.config["JSON_PROVIDER"] == "orjson":
+        app.json = ORJSONProvider(app)
+
+
+def requested_fields(model, sort=None):
+    """
+    Column names asked for with ?fields=name,model, in table order and always
+    with the id and the `sort` column (used by the pagination cursor). None when
+    not given: all columns.
+    """
+    fields = request.args.get("fields")
+    if not fields:
+        return None
+
+    names = set(field.strip() for field in fields.split(",") if field.strip())
+    unknown = names - set(model.__table__.columns.keys())
+    if unknown:
+        raise APIException(f"Unknown fields: {', '.join(sorted(unknown))}", status_code=400)
+    if sort is not None:
+        names.add(sort[0].name)
+    return [column.name for column in model.__table__.columns if column.primary_key or column.name in names]
+
+
+def columns(model, fields=None):
+    """The columns serialize() emits, in the same order (every column of the table), or only `fields`."""
+    if fields is None:
+        return list(model.__table__.columns)
+    return [model.__table__.c[name] for name in fields]
+
+
+def select_columns(model, fields=None):
+    """Query of plain row tuples with the model's serialized columns, no ORM objects."""
+    return model.query.with_entities(*columns(model, fields))
+
+
+def to_dicts(rows):
+    """Serialized dicts for the rows of a select_columns() query."""
+    if not rows:
+        return []
+    names = rows[0]._fields
+    return [dict(zip(names, row)) for row in rows]
+
+
+def get_projected(model, id, fields):
+    """Only `fields` of the row with this id, read with a projected SELECT. None if it doesn't exist."""
+    row = select_columns(model, fields).filter(model.id == id).first()
+    return dict(zip(row._fields, row)) if row is not None else None
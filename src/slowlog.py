@@ -0,0 +1,120 @@
+"""
+Slow query log. Statements taking SLOW_QUERY_MS or more are written as JSON
+lines to SLOW_QUERY_LOG, a rotating file:
+
+    {"time": "...", "duration_ms": 812.4, "route": "GET /users/favorites/<int:id>",
+     "statement": "SELECT ...", "parameters": [5, "<str:9>"], "plan": [...]}
+
+String parameters are redacted to their length (numbers are kept, they are
+mostly ids). With SLOW_QUERY_EXPLAIN=1 the SELECTs are also explained
+(EXPLAIN QUERY PLAN on SQLite, EXPLAIN (FORMAT JSON) on Postgres, EXPLAIN on
+MySQL), without ANALYZE, so the statement is not run again.
+
+The request thread only puts the record on a queue. Writing it, and running
+the EXPLAIN on another pooled connection, happen in a QueueListener thread.
+"""
+import atexit
+import json
+import logging
+import queue
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from flask import request, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger("slow_queries")
+
+EXPLAIN = {
+    "sqlite": "EXPLAIN QUERY PLAN ",
+    "postgresql": "EXPLAIN (FORMAT JSON) ",
+    "mysql": "EXPLAIN ",
+}
+
+
+def redact(value):
+    if isinstance(value, (list, tuple)):
+        return [redact(item) for item in value]
+    if isinstance(value, dict):
+        return {name: redact(item) for name, item in value.items()}
+    if isinstance(value, str):
+        return f"<str:{len(value)}>"
+    if isinstance(value, (bytes, bytearray)):
+        return f"<bytes:{len(value)}>"
+    return value
+
+
+class SlowQueryHandler(RotatingFileHandler):
+    """Rotating JSON lines file, adding the plan of the statement when asked to."""
+
+    def emit(self, record):
+        if getattr(record, "explain", None) is not None:
+            record.slow_query["plan"] = self.explain(*record.explain)
+        super().emit(record)
+
+    def explain(self, engine, statement, parameters):
+        try:
+            with engine.connect() as conn:
+                rows = conn.exec_driver_sql(EXPLAIN[engine.dialect.name] + statement, parameters).all()
+            return [list(row) if len(row) > 1 else row[0] for row in rows]
+        except Exception as e:
+            return f"EXPLAIN failed: {e}"
+
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {"time": datetime.fromtimestamp(record.created, timezone.utc).isoformat()}
+        entry.update(record.slow_query)
+        return json.dumps(entry, default=str)
+
+
+def setup_slow_query_log(app):
+    threshold = app.config["SLOW_QUERY_MS"] / 1000
+    if threshold <= 0:
+        return
+    explain = app.config["SLOW_QUERY_EXPLAIN"]
+
+    handler = SlowQueryHandler(app.config["SLOW_QUERY_LOG"], maxBytes=app.config["SLOW_QUERY_LOG_MAX_BYTES"],
+                               backupCount=app.config["SLOW_QUERY_LOG_BACKUPS"])
+    handler.setFormatter(JSONFormatter())
+    records = queue.SimpleQueue()
+    listener = QueueListener(records, handler)
+    listener.start()
+    atexit.register(listener.stop)
+
+    logger.setLevel(logging.WARNING)
+    logger.propagate = False
+    logger.addHandler(QueueHandler(records))
+
+    @event.listens_for(Engine, "before_cursor_execute")
+    def start_query(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("slow_query_start", []).append(time.perf_counter())
+
+    @event.listens_for(Engine, "after_cursor_execute")
+    def end_query(conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get("slow_query_start")
+        if not starts:
+            return
+        duration = time.perf_counter() - starts.pop()
+        if duration < threshold or statement.startswith("EXPLAIN"):
+            return
+
+        # Flagged executemany with a single row when the driver runs it row by row
+        many = executemany and isinstance(parameters, list)
+        entry = {
+            "duration_ms": round(duration * 1000, 3),
+            "route": f"{request.method} {request.url_rule.rule if request.url_rule else request.path}"
+                     if has_request_context() else None,
+            "database": conn.engine.url.render_as_string(hide_password=True),
+            "statement": statement,
+            "parameters": redact(parameters[:1] if many else parameters),
+        }
+        if many:
+            entry["rows"] = len(parameters)
+        plan = None
+        # The async engines can't be used from the listener thread
+        if explain and not many and conn.engine.dialect.name in EXPLAIN and not conn.engine.dialect.is_async \
+                and statement.lstrip().upper().startswith(("SELECT", "WITH")):
+            plan = (conn.engine, statement, parameters)
+        logger.warning("slow query", extra={"slow_query": entry, "explain": plan})
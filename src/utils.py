@@ -1,4 +1,7 @@
-from flask import jsonify, url_for
+import base64
+import json
+from sqlalchemy import tuple_
+from flask import jsonify, url_for, request, current_app, Response, stream_with_context
 
 class APIException(Exception):
     status_code = 400
@@ -15,6 +18,107 @@ class APIException(Exception):
         rv['message'] = self.message
         return rv
 
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except ValueError:
+        raise APIException("Invalid cursor", status_code=400)
+    if not isinstance(values, list) or not values:
+        raise APIException("Invalid cursor", status_code=400)
+    return values
+
+def page_limit():
+    limit = request.args.get("limit", current_app.config["PAGE_SIZE"])
+    try:
+        limit = int(limit)
+    except ValueError:
+        raise APIException("Limit must be an integer", status_code=400)
+    if limit < 1:
+        raise APIException("Limit must be greater than 0", status_code=400)
+    return min(limit, current_app.config["MAX_PAGE_SIZE"])
+
+def paginate(query, model, sort=None):
+    """
+    Keyset pagination: reads `limit` and `cursor` from the query string and
+    returns (rows, next_cursor). Rows are ordered by id, or by (column, id) for
+    a `sort` of (column, descending), and the cursor holds the key of the last
+    row. One extra row is fetched to know if there is a next page, so every
+    request is a single bounded SELECT.
+    """
+    query, limit = page_query(query, model, sort)
+    return page_result(query.all(), limit, sort)
+
+def page_query(query, model, sort=None):
+    """The bounded query of paginate(), and the page size, for callers that run it themselves."""
+    limit = page_limit()
+    cursor = request.args.get("cursor")
+    if cursor:
+        values = decode_cursor(cursor)
+        if type(values[-1]) != int or len(values) != (2 if sort else 1) or type(values[0]) not in (int, str):
+            raise APIException("Invalid cursor", status_code=400)
+        if sort is None:
+            query = query.filter(model.id > values[0])
+        elif sort[1]:
+            query = query.filter(tuple_(sort[0], model.id) < tuple_(*values))
+        else:
+            query = query.filter(tuple_(sort[0], model.id) > tuple_(*values))
+    return query.order_by(*order_by(model, sort)).limit(limit + 1), limit
+
+def page_result(rows, limit, sort=None):
+    """(rows, next_cursor) from the rows of a page_query()."""
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor([getattr(last, sort[0].name), last.id] if sort else [last.id])
+    return rows, next_cursor
+
+def order_by(model, sort=None):
+    if sort is None:
+        return [model.id]
+    column, descending = sort
+    return [column.desc(), model.id.desc()] if descending else [column, model.id]
+
+def wants_stream():
+    if request.args.get("stream") in ("1", "true"):
+        return True
+    best = request.accept_mimetypes.best_match(["application/json", "application/x-ndjson"])
+    return best == "application/x-ndjson"
+
+def stream_rows(query, model, sort=None):
+    """
+    Export every row of a select_columns() query as NDJSON. Rows are fetched `yield_per`
+    at a time (a server-side cursor on Postgres) and written out one chunk
+    per batch, so memory does not grow with the size of the table.
+    """
+    batch_size = current_app.config["STREAM_BATCH_SIZE"]
+    dumps = current_app.json.dumps
+
+    def generate():
+        lines = []
+        names = None
+        try:
+            for row in query.order_by(*order_by(model, sort)).yield_per(batch_size):
+                if names is None:
+                    names = row._fields
+                lines.append(dumps(dict(zip(names, row))))
+                if len(lines) == batch_size:
+                    yield "\n".join(lines) + "\n"
+                    lines = []
+            if lines:
+                yield "\n".join(lines) + "\n"
+        finally:
+            # The request's session was already removed when the view returned,
+            # the query checked out a connection again: give it back, also when
+            # the client disconnects mid-stream
+            query.session.close()
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
 def has_no_empty_params(rule):
     defaults = rule.defaults if rule.defaults is not None else ()
     arguments = rule.arguments if rule.arguments is not None else ()
@@ -0,0 +1,64 @@
+"""
+Request validation for the catalog models, derived from their db.Column definitions
+"""
+from models import People, Vehicles, Planets
+
+TYPE_NAMES = {str: "a string", int: "an integer"}
+
+
+class Schema:
+    """
+    Field rules read once from the model's columns (type, length, nullability)
+    so validating a request is a single loop over precomputed tuples. Every
+    error is reported, not only the first one.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.fields = []
+        for column in model.__table__.columns:
+            if column.primary_key:
+                continue
+            field_type = column.type.python_type
+            label = column.name.replace("_", " ").capitalize()
+            self.fields.append((
+                column.name,
+                field_type,
+                getattr(column.type, "length", None),
+                column.nullable,
+                f"{label} not found",
+                f"{label} must be {TYPE_NAMES[field_type]}",
+                f"{label} can't be null",
+                f"{label} must be at most {getattr(column.type, 'length', None)} characters",
+            ))
+        self.names = [field[0] for field in self.fields]
+
+    def validate(self, data, partial=False):
+        """Errors for `data`, empty when valid. With `partial` (updates) missing fields are allowed."""
+        if data is None:
+            return ["The request body is null"]
+        if type(data) != dict:
+            return ["The request body must be an object"]
+
+        errors = []
+        for name, field_type, max_length, nullable, missing, wrong_type, null, too_long in self.fields:
+            if not name in data:
+                if not partial and not nullable:
+                    errors.append(missing)
+                continue
+            value = data[name]
+            if value is None:
+                if not nullable:
+                    errors.append(null)
+            elif type(value) != field_type:
+                errors.append(wrong_type)
+            elif max_length is not None and len(value) > max_length:
+                errors.append(too_long)
+        return errors
+
+    def values(self, data):
+        """The model fields present in `data`, ready to be passed to the model."""
+        return {name: data[name] for name in self.names if name in data}
+
+
+SCHEMAS = {model: Schema(model) for model in (People, Vehicles, Planets)}
@@ -0,0 +1,27 @@
+import os
+import sys
+import tempfile
+import pytest
+
+# The app reads its configuration at import time: point it at a scratch database first
+DB_PATH = os.path.join(tempfile.mkdtemp(prefix="sw_tests_"), "test.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+os.environ.setdefault("CACHE_BACKEND", "memory")
+# Fail fast instead of waiting 30s when a test exhausts the pool
+os.environ.setdefault("DB_POOL_TIMEOUT", "2")
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+
+@pytest.fixture
+def client():
+    """A test client on empty tables, inside an app context."""
+    from app import app
+    from models import db
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        yield app.test_client()
+        db.session.remove()
+        db.drop_all()
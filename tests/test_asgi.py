@@ -0,0 +1,38 @@
+"""
+The native async reads of asgi.py answer like the Flask views, down to
+the bodies a server accepts for 204 and 304 responses.
+"""
+import asyncio
+import httpx
+import pytest
+from asgi import application
+from cache import cache, SQLiteBackend
+
+PLANET = {"name": "Tatooine", "diameter": 10465, "rotation_period": 23, "orbital_period": 304,
+          "gravity": "1 standard", "population": 200000, "climate": "arid", "surface_water": 1, "terrain": "desert"}
+
+
+def get(path, headers=None):
+    async def request():
+        transport = httpx.ASGITransport(app=application)
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+            return await client.get(path, headers=headers)
+    return asyncio.run(request())
+
+
+@pytest.mark.parametrize("path", ["/planets", "/people?gender=nope"])
+def test_empty_collection_has_no_body(client, path):
+    response = get(path)
+    assert response.status_code == 204
+    assert response.content == b""
+    assert "content-length" not in response.headers
+
+
+def test_not_modified_has_no_body(client, tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "backend", SQLiteBackend(str(tmp_path / "cache.db")))
+    client.post("/planets", json=PLANET)
+
+    etag = get("/planets/1").headers["etag"]
+    response = get("/planets/1", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
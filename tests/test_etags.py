@@ -0,0 +1,70 @@
+"""
+ETags are only sent, and If-None-Match only answered, when the table
+versions are shared by every worker.
+"""
+import pytest
+from cache import cache, MemoryBackend, SQLiteBackend
+
+PLANET = {"name": "Tatooine", "diameter": 10465, "rotation_period": 23, "orbital_period": 304,
+          "gravity": "1 standard", "population": 200000, "climate": "arid", "surface_water": 1, "terrain": "desert"}
+
+
+@pytest.fixture
+def memory_cache(monkeypatch):
+    monkeypatch.setattr(cache, "backend", MemoryBackend())
+
+
+@pytest.fixture
+def shared_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "backend", SQLiteBackend(str(tmp_path / "cache.db")))
+
+
+def test_no_etags_with_the_memory_backend(client, memory_cache):
+    client.post("/planets", json=PLANET)
+
+    response = client.get("/planets/1")
+    assert response.status_code == 200
+    assert response.headers.get("ETag") is None
+    assert client.get("/planets/1", headers={"If-None-Match": '"anything"'}).status_code == 200
+
+
+def test_etags_change_with_writes_on_a_shared_backend(client, shared_cache):
+    client.post("/planets", json=PLANET)
+
+    etag = client.get("/planets/1").headers["ETag"]
+    assert client.get("/planets/1", headers={"If-None-Match": etag}).status_code == 304
+
+    client.put("/planets/1", json={"population": 1})
+    response = client.get("/planets/1", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.get_json()["response"]["population"] == 1
+
+
+def test_no_etags_on_replica_reads(client, shared_cache, monkeypatch):
+    from app import app
+    from etag import request_etag
+    from replicas import RoutingSession
+
+    with app.test_request_context("/planets"):
+        assert request_etag(["planets"]) is not None
+    monkeypatch.setattr(RoutingSession, "replica", lambda session: "replica_0")
+    with app.test_request_context("/planets"):
+        assert request_etag(["planets"]) is None
+
+
+def test_favourites_304_varies_on_accept_version(client, shared_cache):
+    from models import db, Users
+
+    db.session.add(Users(user_name="luke", first_name="Luke", last_name="Skywalker", email="luke@example.com",
+                         password="secret"))
+    db.session.commit()
+    client.post("/planets", json=PLANET)
+    client.post("/favorite/planet/1/1")
+
+    for headers in ({}, {"Accept-Version": "2"}):
+        response = client.get("/users/favorites/1", headers=headers)
+        assert response.status_code == 200
+        assert "Accept-Version" in response.vary
+        response = client.get("/users/favorites/1", headers={**headers, "If-None-Match": response.headers["ETag"]})
+        assert response.status_code == 304
+        assert "Accept-Version" in response.vary
@@ -0,0 +1,50 @@
+"""
+POST /favorite/<kind>/<id>/<user_id> answers a duplicate with the same
+statements as a new favourite: no row is read again after the commit.
+"""
+import pytest
+from sqlalchemy import event
+from models import db, Users, People, Vehicles, Planets
+
+TARGETS = {
+    "people": (People, {"name": "Luke Skywalker", "gender": "male", "birth_year": "19BBY", "eye_color": "blue",
+                        "hair_color": "blond", "mass": 77, "height": 172}),
+    "vehicle": (Vehicles, {"name": "X-wing", "model": "T-65", "vehicle_class": "starfighter", "manufacturer": "Incom",
+                           "cost_in_credits": 1000, "length": 12, "crew": 1, "passengers": 0,
+                           "max_atmosphering_speed": 1050, "cargo_capacity": 110, "consumables": "1 week"}),
+    "planet": (Planets, {"name": "Tatooine", "diameter": 10465, "rotation_period": 23, "orbital_period": 304,
+                         "gravity": "1 standard", "population": 200000, "climate": "arid", "surface_water": 1,
+                         "terrain": "desert"}),
+}
+
+
+def post(client, path):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        response = client.post(path)
+    finally:
+        event.remove(db.engine, "before_cursor_execute", before_cursor_execute)
+    assert response.status_code == 200
+    return response.get_json(), statements
+
+
+@pytest.mark.parametrize("kind", TARGETS)
+def test_duplicate_favourite_runs_no_extra_select(client, kind):
+    model, values = TARGETS[kind]
+    db.session.add(Users(user_name="luke", first_name="Luke", last_name="Skywalker", email="luke@example.com",
+                         password="secret"))
+    db.session.add(model(**values))
+    db.session.commit()
+    db.session.remove()
+
+    body, first = post(client, f"/favorite/{kind}/1/1")
+    assert body["created"] is True
+    body, duplicate = post(client, f"/favorite/{kind}/1/1")
+    assert body["created"] is False
+    assert body["msg"] == f"User luke with favorite {'person' if kind == 'people' else kind} {values['name']} already exist"
+    assert len(duplicate) == len(first)
@@ -0,0 +1,68 @@
+"""
+GET /users/favorites/<id> runs a fixed number of SQL statements (the user and
+one per favourites table), whatever the number of favourites.
+"""
+import pytest
+from sqlalchemy import event
+from models import db, Users, People, Vehicles, Planets, Favourites_people, Favourites_vehicles, Favourites_planets
+
+FAVOURITES = ((People, Favourites_people, "person_id"), (Vehicles, Favourites_vehicles, "vehicles_id"),
+              (Planets, Favourites_planets, "planets_id"))
+
+
+def targets(model, count):
+    if model is People:
+        return [{"name": f"Person {i}", "gender": "male", "birth_year": "19BBY", "eye_color": "blue",
+                 "hair_color": "blond", "mass": 77, "height": 172} for i in range(count)]
+    if model is Vehicles:
+        return [{"name": f"Vehicle {i}", "model": "T-65", "vehicle_class": "starfighter", "manufacturer": "Incom",
+                 "cost_in_credits": 1000, "length": 12, "crew": 1, "passengers": 0, "max_atmosphering_speed": 1050,
+                 "cargo_capacity": 110, "consumables": "1 week"} for i in range(count)]
+    return [{"name": f"Planet {i}", "diameter": 10465, "rotation_period": 23, "orbital_period": 304,
+             "gravity": "1 standard", "population": 200000, "climate": "arid", "surface_water": 1,
+             "terrain": "desert"} for i in range(count)]
+
+
+def seed_user(user_name, favourites):
+    """A user with `favourites` favourites of each kind, returns its id."""
+    user = Users(user_name=user_name, first_name="Luke", last_name="Skywalker", email=f"{user_name}@example.com",
+                 password="secret")
+    db.session.add(user)
+    db.session.flush()
+    for model, favourite_model, column in FAVOURITES:
+        first_id = db.session.query(db.func.coalesce(db.func.max(model.id), 0)).scalar()
+        db.session.execute(db.insert(model), [{**row, "name": f"{row['name']} {user_name}"}
+                                              for row in targets(model, favourites)])
+        db.session.execute(db.insert(favourite_model), [{"user_id": user.id, column: first_id + i + 1}
+                                                        for i in range(favourites)])
+    db.session.commit()
+    return user.id
+
+
+def count_statements(client, path):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        response = client.get(path)
+    finally:
+        event.remove(db.engine, "before_cursor_execute", before_cursor_execute)
+    assert response.status_code == 200
+    return response, statements
+
+
+@pytest.mark.parametrize("query", ["", "?format=compact"])
+def test_favourites_statements_do_not_grow_with_favourites(client, query):
+    few = seed_user("few", 5)
+    many = seed_user("many", 50)
+
+    response, few_statements = count_statements(client, f"/users/favorites/{few}{query}")
+    assert response.get_json()["response"]
+    response, many_statements = count_statements(client, f"/users/favorites/{many}{query}")
+    assert response.get_json()["response"]
+
+    assert len(few_statements) == 4
+    assert len(many_statements) == len(few_statements)
@@ -0,0 +1,38 @@
+"""
+NDJSON exports give their connection back to the pool when the stream ends,
+or when the client goes away in the middle of it.
+"""
+from app import app
+from models import db, People
+
+
+def seed_people(count):
+    db.session.execute(db.insert(People), [{
+        "name": f"Person {i}", "gender": "female", "birth_year": "19BBY", "eye_color": "brown",
+        "hair_color": "black", "mass": 50, "height": 150} for i in range(count)])
+    db.session.commit()
+
+
+def pool_capacity():
+    return app.config["DB_POOL_SIZE"] + app.config["DB_MAX_OVERFLOW"]
+
+
+def test_streams_release_their_connection(client):
+    seed_people(50)
+
+    for i in range(pool_capacity() + 5):
+        response = client.get("/people?stream=1")
+        assert response.status_code == 200
+        assert len(response.data.splitlines()) == 50
+        assert db.engine.pool.checkedout() == 0
+
+
+def test_interrupted_streams_release_their_connection(client, monkeypatch):
+    monkeypatch.setitem(app.config, "STREAM_BATCH_SIZE", 10)
+    seed_people(50)
+
+    for i in range(pool_capacity() + 5):
+        response = client.get("/people?stream=1", buffered=False)
+        assert next(response.response)
+        response.close()
+        assert db.engine.pool.checkedout() == 0